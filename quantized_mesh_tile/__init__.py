@@ -5,19 +5,18 @@ Reference
 ---------
 """
 
-# Enable Shapely "speedups" if available
-# http://toblerity.org/shapely/manual.html#performance
-from shapely import speedups
+import gzip
+
+import numpy as np
 
 from .terrain import TerrainTile
 from .topology import TerrainTopology
-
-if speedups.available:
-    speedups.enable()
+from .utils import isGzipped
 
 
 def encode(geometries, bounds=[], autocorrectGeometries=False, hasLighting=False,
-           watermask=[]):
+           watermask=[], optimizeOrder=False, mortonOrder=False,
+           exactBoundingSphere=False):
     """
     Function to convert geometries into a
     :class:`quantized_mesh_tile.terrain.TerrainTile` instance.
@@ -32,6 +31,14 @@ def encode(geometries, bounds=[], autocorrectGeometries=False, hasLighting=False
         or
         A list of triplet of vertices using the following structure:
         ``(((lon0/lat0/height0),(...),(lon2,lat2,height2)),(...))``
+        or
+        A numpy array of shape (T, 3, 3) containing the vertices of T triangles.
+        See :meth:`quantized_mesh_tile.topology.TerrainTopology.fromArrays`.
+        or
+        A numpy array of objects containing WKT or WKB Polygons, which are all
+        parsed at once. With ``autocorrectGeometries``, the polygons which are
+        not triangles are triangulated.
+        See :meth:`quantized_mesh_tile.topology.TerrainTopology.fromGeometries`.
 
     ``bounds``
 
@@ -55,30 +62,68 @@ def encode(geometries, bounds=[], autocorrectGeometries=False, hasLighting=False
 
     ``watermask``
 
-        A water mask list (Optional). Adds rendering water effect.
-        The water mask list is either one byte, `[0]` for land and `[255]` for
-        water, either a list of 256*256 values ranging from 0 to 255.
+        A water mask list or array (Optional). Adds rendering water effect.
+        The water mask is either one byte, `[0]` for land and `[255]` for
+        water, either 256*256 values ranging from 0 to 255 (a list of 256 rows or
+        an array of shape (256, 256)). A water mask which is entirely land or
+        entirely water is written as a single byte.
         Values in the mask are defined from north-to-south and west-to-east.
         Per default no watermask is applied. Note that the water mask effect depends on
         the texture of the raster layer drapped over your terrain.
 
         Default is `[]`.
 
+    ``optimizeOrder``
+
+        When set to `True`, the triangles are reordered for the vertex cache of the
+        GPU and the vertices are renumbered in the order of their first use, which
+        makes the tile smaller once gzipped and faster to render.
+        See :meth:`quantized_mesh_tile.topology.TerrainTopology.reorder`.
+
+        Default is `False`.
+
+    ``mortonOrder``
+
+        When set to `True`, the triangles are first sorted along a Morton curve, so
+        that consecutive vertices are close to each other. Implies the renumbering
+        of the vertices.
+
+        Default is `False`.
+
+    ``exactBoundingSphere``
+
+        When set to `True`, the bounding sphere of the header is the minimal
+        sphere enclosing the vertices, which is tighter but more expensive to
+        compute.
+
+        Default is `False`.
+
     """
-    topology = TerrainTopology(geometries=geometries,
-                               autocorrectGeometries=autocorrectGeometries,
-                               hasLighting=hasLighting)
+    isArray = isinstance(geometries, np.ndarray)
+    if isArray and geometries.dtype == object and not autocorrectGeometries:
+        topology = TerrainTopology.fromGeometries(geometries, hasLighting=hasLighting)
+    elif isArray and geometries.dtype != object:
+        topology = TerrainTopology.fromArrays(geometries, hasLighting=hasLighting)
+    else:
+        topology = TerrainTopology(geometries=geometries,
+                                   autocorrectGeometries=autocorrectGeometries,
+                                   hasLighting=hasLighting)
+    if optimizeOrder or mortonOrder:
+        topology.reorder(vertexCache=optimizeOrder, morton=mortonOrder)
     if len(bounds) == 4:
         west, south, east, north = bounds
         tile = TerrainTile(topology=topology,
                            watermask=watermask,
-                           west=west, south=south, east=east, north=north)
+                           west=west, south=south, east=east, north=north,
+                           exactBoundingSphere=exactBoundingSphere)
     else:
-        tile = TerrainTile(topology=topology, watermask=watermask)
+        tile = TerrainTile(topology=topology, watermask=watermask,
+                           exactBoundingSphere=exactBoundingSphere)
     return tile
 
 
-def decode(filePath, bounds, hasLighting=False, hasWatermask=False, gzipped=False):
+def decode(filePath, bounds, hasLighting=None, hasWatermask=None, gzipped=None,
+           lazy=False):
     """
     Function to convert a quantized-mesh terrain tile file into a
     :class:`quantized_mesh_tile.terrain.TerrainTile` instance.
@@ -95,13 +140,31 @@ def decode(filePath, bounds, hasLighting=False, hasWatermask=False, gzipped=Fals
 
     ``hasLighting`` (Experimental)
 
-        Indicate whether the tile has the lighting extension.
+        Indicate whether the lighting extension should be read.
+        If `None`, the extension is read when present in the tile.
+        If `False`, the extension is skipped.
 
-        Default is `False`.
+        Default is `None`.
 
     ``hasWatermask``
 
-        Indicate whether the tile has the water-mask extension.
+        Indicate whether the water-mask extension should be read.
+        If `None`, the extension is read when present in the tile.
+        If `False`, the extension is skipped.
+
+        Default is `None`.
+
+    ``gzipped``
+
+        Indicate whether the tile content is gzipped.
+        If `None`, gzip compression is detected from the magic number.
+
+        Default is `None`.
+
+    ``lazy``
+
+        Decode the sections of the tile (vertices, indices, edges and extensions)
+        only when they are first accessed.
 
         Default is `False`.
 
@@ -109,5 +172,29 @@ def decode(filePath, bounds, hasLighting=False, hasWatermask=False, gzipped=Fals
     west, south, east, north = bounds
     tile = TerrainTile(west=west, south=south, east=east, north=north)
     tile.fromFile(
-        filePath, hasLighting=hasLighting, hasWatermask=hasWatermask, gzipped=gzipped)
+        filePath, hasLighting=hasLighting, hasWatermask=hasWatermask, gzipped=gzipped,
+        lazy=lazy)
     return tile
+
+
+def probe(filePath):
+    """
+    Function to read only the header of a quantized-mesh terrain tile file.
+    Gzipped files are detected automatically and only the first bytes of the
+    stream are decompressed.
+    Returns an ordered dictionary with the values of the quantized mesh header
+    (minimum and maximum heights, bounding sphere, horizon occlusion point...)
+    and the `vertexCount`.
+
+    Arguments:
+
+    ``filePath``
+
+        An absolute or relative path to a quantized-mesh terrain tile. (Required)
+
+    """
+    with open(filePath, 'rb') as f:
+        if isGzipped(f):
+            with gzip.GzipFile(fileobj=f, mode='rb') as gz:
+                return TerrainTile.readHeader(gz)
+        return TerrainTile.readHeader(f)
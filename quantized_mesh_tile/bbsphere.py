@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import itertools
 import math
 
-from . import cartesian3d as c3d
+import numpy as np
+
+# Relative tolerance used when testing whether a point lies within a sphere
+EPSILON = 1e-12
 
 
 class BoundingSphere(object):
@@ -19,83 +23,85 @@ class BoundingSphere(object):
         self.maxPointY = [MIN, MIN, MIN]
         self.maxPointZ = [MIN, MIN, MIN]
 
-    # Based on Ritter's algorithm
-    def fromPoints(self, points):
+    def fromPoints(self, points, exact=False):
+        """
+        Computes the bounding sphere of a list or a (N, 3) array of points.
+
+        By default the sphere is the smallest of Ritter's sphere and of the
+        naive sphere around the points bounding box.
+        If ``exact`` is ``True``, the minimal enclosing sphere is computed
+        instead, which is tighter but more expensive.
+        """
+        points = np.asarray(points, dtype=np.float64)
 
         nbPositions = len(points)
         if nbPositions < 2:
             raise Exception('Your list of points must contain at least 2 points')
+        points = points.reshape(nbPositions, 3)
+
+        # Store the points containing the smallest and largest component
+        # Used for the naive approach
+        minIndices = np.argmin(points, axis=0)
+        maxIndices = np.argmax(points, axis=0)
+        self.minPointX, self.minPointY, self.minPointZ = \
+            points[minIndices].tolist()
+        self.maxPointX, self.maxPointY, self.maxPointZ = \
+            points[maxIndices].tolist()
+
+        if exact:
+            center, radius = self._minimalSphere(points)
+        else:
+            center, radius = self._ritterSphere(points, minIndices, maxIndices)
 
-        for i in range(0, nbPositions):
-            point = points[i]
-
-            # Store the points containing the smallest and largest component
-            # Used for the naive approach
-            if point[0] < self.minPointX[0]:
-                self.minPointX = point
-
-            if point[1] < self.minPointY[1]:
-                self.minPointY = point
-
-            if point[2] < self.minPointZ[2]:
-                self.minPointZ = point
-
-            if point[0] > self.maxPointX[0]:
-                self.maxPointX = point
-
-            if point[1] > self.maxPointY[1]:
-                self.maxPointY = point
-
-            if point[2] > self.maxPointZ[2]:
-                self.maxPointZ = point
+        self.center = center
+        self.radius = radius
 
+    # Based on Ritter's algorithm
+    def _ritterSphere(self, points, minIndices, maxIndices):
         # Squared distance between each component min and max
-        xSpan = c3d.magnitudeSquared(c3d.subtract(self.maxPointX, self.minPointX))
-        ySpan = c3d.magnitudeSquared(c3d.subtract(self.maxPointY, self.minPointY))
-        zSpan = c3d.magnitudeSquared(c3d.subtract(self.maxPointZ, self.minPointZ))
-
-        diameter1 = self.minPointX
-        diameter2 = self.maxPointX
-        maxSpan = xSpan
-        if ySpan > maxSpan:
-            maxSpan = ySpan
-            diameter1 = self.minPointY
-            diameter2 = self.maxPointY
-        if zSpan > maxSpan:
-            maxSpan = zSpan
-            diameter1 = self.minPointZ
-            diameter2 = self.maxPointZ
+        spans = np.sum(
+            (points[maxIndices] - points[minIndices]) ** 2, axis=1
+        )
+        # First largest span wins as in a sequential comparison
+        axis = int(np.argmax(spans))
+        diameter1 = points[minIndices[axis]].tolist()
+        diameter2 = points[maxIndices[axis]].tolist()
 
         ritterCenter = [
             (diameter1[0] + diameter2[0]) * 0.5,
             (diameter1[1] + diameter2[1]) * 0.5,
             (diameter1[2] + diameter2[2]) * 0.5
         ]
-
-        radiusSquared = c3d.magnitudeSquared(c3d.subtract(diameter2, ritterCenter))
+        radiusSquared = (
+            (diameter2[0] - ritterCenter[0]) ** 2 +
+            (diameter2[1] - ritterCenter[1]) ** 2 +
+            (diameter2[2] - ritterCenter[2]) ** 2
+        )
         ritterRadius = math.sqrt(radiusSquared)
 
         # Initial center and radius (naive) get min and max box
-        minBoxPt = [self.minPointX[0], self.minPointY[1], self.minPointZ[2]]
-        maxBoxPt = [self.maxPointX[0], self.maxPointY[1], self.maxPointZ[2]]
-        naiveCenter = c3d.multiplyByScalar(c3d.add(minBoxPt, maxBoxPt), 0.5)
-        naiveRadius = 0.0
-
-        for i in range(0, nbPositions):
-            currentP = points[i]
-
-            # Find the furthest point from the naive center to calculate the naive radius.
-            r = c3d.magnitude(c3d.subtract(currentP, naiveCenter))
-            if r > naiveRadius:
-                naiveRadius = r
-
-            # Make adjustments to the Ritter Sphere to include all points.
-            oldCenterToPointSquared = c3d.magnitudeSquared(
-                c3d.subtract(currentP, ritterCenter)
+        minBoxPt = points[minIndices, [0, 1, 2]]
+        maxBoxPt = points[maxIndices, [0, 1, 2]]
+        naiveCenter = (minBoxPt + maxBoxPt) * 0.5
+        # Find the furthest point from the naive center
+        naiveRadius = math.sqrt(
+            np.max(_distancesSquared(points, naiveCenter))
+        )
+
+        # Make adjustments to the Ritter Sphere to include all points.
+        # The sphere only grows, so the points already within the initial
+        # sphere never require an adjustment.
+        outside = _distancesSquared(points, ritterCenter) > radiusSquared
+        for currentP in points[outside].tolist():
+            oldCenterToPointSquared = (
+                (currentP[0] - ritterCenter[0]) ** 2 +
+                (currentP[1] - ritterCenter[1]) ** 2 +
+                (currentP[2] - ritterCenter[2]) ** 2
             )
             if oldCenterToPointSquared > radiusSquared:
                 oldCenterToPoint = math.sqrt(oldCenterToPointSquared)
                 ritterRadius = (ritterRadius + oldCenterToPoint) * 0.5
+                radiusSquared = ritterRadius ** 2
                 # Calculate center of new Ritter sphere
                 oldToNew = oldCenterToPoint - ritterRadius
                 ritterCenter = [
@@ -109,8 +115,89 @@ class BoundingSphere(object):
 
         # Keep the naive sphere if smaller
         if naiveRadius < ritterRadius:
-            self.radius = ritterRadius
-            self.center = ritterCenter
-        else:
-            self.radius = naiveRadius
-            self.center = naiveCenter
+            return ritterCenter, ritterRadius
+        return naiveCenter.tolist(), naiveRadius
+
+    def _minimalSphere(self, points, maxIterations=1000):
+        """
+        Computes the minimal enclosing sphere by farthest point insertion.
+
+        The sphere of a small support set is solved exactly, then the
+        farthest point outside of it is added to the support set until all
+        the points are enclosed. The radius strictly increases at each step,
+        which bounds the number of iterations.
+        """
+        support = [int(np.argmin(points[:, 0])), int(np.argmax(points[:, 0]))]
+        center, radius = _circumsphere(points[support])
+        for _ in range(maxIterations):
+            distances = _distancesSquared(points, center)
+            farthest = int(np.argmax(distances))
+            if math.sqrt(distances[farthest]) <= \
+                    radius + EPSILON * max(radius, 1.0):
+                break
+            support = _reduceSupport(points, support + [farthest])
+            center, radius = _circumsphere(points[support])
+
+        # Make sure every point is enclosed despite the rounding errors
+        radius = max(radius, math.sqrt(np.max(_distancesSquared(points, center))))
+        return center.tolist(), radius
+
+
+def _distancesSquared(points, center):
+    d = points - center
+    return d[:, 0] ** 2 + d[:, 1] ** 2 + d[:, 2] ** 2
+
+
+def _circumsphere(p):
+    """
+    Returns the center and radius of the smallest sphere passing through the
+    1 to 4 points p, or None if they are degenerate.
+    """
+    a = p[0]
+    if len(p) == 1:
+        return a, 0.0
+    if len(p) == 2:
+        center = (p[0] + p[1]) * 0.5
+        return center, math.sqrt(np.sum((p[1] - center) ** 2))
+    if len(p) == 3:
+        ab = p[1] - a
+        ac = p[2] - a
+        n = np.cross(ab, ac)
+        nn = np.dot(n, n)
+        if nn <= EPSILON * np.dot(ab, ab) * np.dot(ac, ac):
+            return None
+        offset = (np.dot(ac, ac) * np.cross(n, ab) +
+                  np.dot(ab, ab) * np.cross(ac, n)) / (2.0 * nn)
+        return a + offset, math.sqrt(np.dot(offset, offset))
+    edges = p[1:] - a
+    det = np.linalg.det(edges)
+    scale = np.prod(np.sqrt(np.sum(edges ** 2, axis=1)))
+    if abs(det) <= EPSILON * scale:
+        return None
+    offset = np.linalg.solve(2.0 * edges, np.sum(edges ** 2, axis=1))
+    return a + offset, math.sqrt(np.dot(offset, offset))
+
+
+def _reduceSupport(points, support):
+    """
+    Returns the subset of at most 4 support points whose circumsphere is the
+    smallest sphere enclosing all the support points.
+    """
+    candidates = points[support]
+    best = None
+    for size in range(2, min(len(support), 4) + 1):
+        for subset in itertools.combinations(range(len(support)), size):
+            sphere = _circumsphere(candidates[list(subset)])
+            if sphere is None:
+                continue
+            center, radius = sphere
+            if best is not None and radius >= best[1]:
+                continue
+            tolerance = radius + EPSILON * max(radius, 1.0) * 1e3
+            if np.all(np.sqrt(_distancesSquared(candidates, center)) <=
+                      tolerance):
+                best = ([support[i] for i in subset], radius)
+    if best is None:
+        # Fully degenerate support, fall back on its two farthest points
+        return support[-2:]
+    return best[0]
@@ -30,6 +30,24 @@ def computeMagnitude(point, sphereCenter):
     return 1.0 / (cosAlpha * cosBeta - sinAlpha * sinBeta)
 
 
+def computeMagnitudes(points, sphereCenter):
+    """
+    Array version of computeMagnitude for a (N, 3) array of points.
+    """
+    magnitudeSquared = np.sum(points * points, axis=1)
+    magnitude = np.sqrt(magnitudeSquared)
+    direction = points * (1 / magnitude)[:, np.newaxis]
+
+    magnitudeSquared = np.maximum(1.0, magnitudeSquared)
+    magnitude = np.maximum(1.0, magnitude)
+
+    cosAlpha = np.dot(direction, sphereCenter)
+    sinAlpha = np.linalg.norm(np.cross(direction, sphereCenter), axis=1)
+    cosBeta = 1.0 / magnitude
+    sinBeta = np.sqrt(magnitudeSquared - 1.0) * cosBeta
+    return 1.0 / (cosAlpha * cosBeta - sinAlpha * sinBeta)
+
+
 # https://cesiumjs.org/2013/05/09/Computing-the-horizon-occlusion-point/
 def fromPoints(points, boundingSphere):
 
@@ -37,13 +55,10 @@ def fromPoints(points, boundingSphere):
         raise Exception('Your list of points must contain at least 2 points')
 
     # Bring coordinates to ellipsoid scaled coordinates
-    def scaleDown(coord):
-        return [coord[0] * rX, coord[1] * rY, coord[2] * rZ]
-    scaledPoints = [scaleDown(coord) for coord in points]
-    scaledSphereCenter = scaleDown(boundingSphere.center)
+    scale = np.array([rX, rY, rZ])
+    scaledPoints = np.asarray(points, dtype=np.float64).reshape(-1, 3) * scale
+    scaledSphereCenter = (np.asarray(boundingSphere.center) * scale).tolist()
 
-    def magnitude(coord):
-        return computeMagnitude(coord, scaledSphereCenter)
-    magnitudes = [magnitude(coord) for coord in scaledPoints]
+    magnitudes = computeMagnitudes(scaledPoints, scaledSphereCenter)
 
-    return c3d.multiplyByScalar(scaledSphereCenter, max(magnitudes))
+    return c3d.multiplyByScalar(scaledSphereCenter, float(np.max(magnitudes)))
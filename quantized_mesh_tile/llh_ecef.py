@@ -2,6 +2,8 @@
 
 import math
 
+import numpy as np
+
 # Constants taken from http://cesiumjs.org/2013/04/25/Horizon-culling/
 radiusX = 6378137.0
 radiusY = 6378137.0
@@ -31,6 +33,49 @@ def LLH2ECEF(lon, lat, alt):
 
     return [x, y, z]
 
+
+# Vectorized version of LLH2ECEF
+# Converts an array of shape (N, 3) of lon/lat/alt into an array of x/y/z
+# The result can be written in a preallocated array of shape (N, 3) (out)
+def LLH2ECEFArray(llh, out=None):
+    llh = np.asarray(llh, dtype='float64').reshape(-1, 3)
+    if out is None:
+        out = np.empty(llh.shape, dtype='float64')
+    lon = llh[:, 0] * (math.pi / 180.0)
+    lat = llh[:, 1] * (math.pi / 180.0)
+    alt = llh[:, 2]
+
+    # Computed once per point
+    sinLat = np.sin(lat)
+    cosLat = np.cos(lat)
+    n = wgs84_a / np.sqrt(1 - wgs84_e2 * (sinLat ** 2))
+
+    # Heights are read last, out may be the input array
+    out[:, 0] = (n + alt) * cosLat * np.cos(lon)
+    out[:, 1] = (n + alt) * cosLat * np.sin(lon)
+    out[:, 2] = (n * (1 - wgs84_e2) + alt) * sinLat
+    return out
+
+
+# Version of LLH2ECEFArray for a regular grid
+# Converts the longitudes of the columns (C,), the latitudes of the rows (R,)
+# and an array of altitudes of shape (R, C) into an array of x/y/z of shape
+# (R, C, 3). The trigonometric functions are computed once per row and column.
+def LLH2ECEFGrid(lons, lats, alts):
+    lon = np.asarray(lons, dtype='float64') * (math.pi / 180.0)
+    lat = np.asarray(lats, dtype='float64')[:, np.newaxis] * (math.pi / 180.0)
+    alt = np.asarray(alts, dtype='float64')
+
+    sinLat = np.sin(lat)
+    cosLat = np.cos(lat)
+    n = wgs84_a / np.sqrt(1 - wgs84_e2 * (sinLat ** 2))
+
+    out = np.empty(alt.shape + (3,), dtype='float64')
+    out[:, :, 0] = (n + alt) * cosLat * np.cos(lon)
+    out[:, :, 1] = (n + alt) * cosLat * np.sin(lon)
+    out[:, :, 2] = (n * (1 - wgs84_e2) + alt) * sinLat
+    return out
+
 # alt is in meters
 
 
@@ -51,3 +96,32 @@ def ECEF2LLH(x, y, z):
     lat *= r
 
     return [lon, lat, alt]
+
+
+# Vectorized version of ECEF2LLH
+# Converts an array of shape (N, 3) of x/y/z into an array of lon/lat/alt
+# The result can be written in a preallocated array of shape (N, 3) (out)
+def ECEF2LLHArray(xyz, out=None):
+    xyz = np.asarray(xyz, dtype='float64').reshape(-1, 3)
+    if out is None:
+        out = np.empty(xyz.shape, dtype='float64')
+    x = xyz[:, 0]
+    y = xyz[:, 1]
+    z = xyz[:, 2]
+
+    ep = math.sqrt((wgs84_a2 - wgs84_b2) / wgs84_b2)
+    p = np.sqrt(x ** 2 + y ** 2)
+    th = np.arctan2(wgs84_a * z, wgs84_b * p)
+    lon = np.arctan2(y, x)
+    lat = np.arctan2(
+        z + ep ** 2 * wgs84_b * np.sin(th) ** 3,
+        p - wgs84_e2 * wgs84_a * np.cos(th) ** 3
+    )
+    N = wgs84_a / np.sqrt(1 - wgs84_e2 * np.sin(lat) ** 2)
+    alt = p / np.cos(lat) - N
+
+    r = 180 / math.pi
+    out[:, 0] = lon * r
+    out[:, 1] = lat * r
+    out[:, 2] = alt
+    return out
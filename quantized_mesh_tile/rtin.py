@@ -0,0 +1,178 @@
+""" This module defines the :class:`quantized_mesh_tile.rtin.RTIN`.
+A right-triangulated irregular network (RTIN) mesher for regular grids of heights,
+based on the Martini library: https://github.com/mapbox/martini
+
+Reference
+---------
+"""
+
+import numpy as np
+
+from .llh_ecef import LLH2ECEFGrid
+from .topology import TerrainTopology
+
+
+class RTIN(object):
+    """
+    This class builds adaptive terrain tile topologies from a grid of heights.
+    The grid is recursively split into right triangles, until the errors of the
+    grid vertices left out of the mesh are smaller than a given maximal error.
+    The error of a vertex is the difference between its height and the height
+    interpolated on the hypotenuse it splits, accumulated over the smaller
+    triangles as in Martini.
+
+    The errors are computed once when creating the instance, so that several
+    topologies can then be created cheaply with different maximal errors,
+    for instance one per level of detail.
+
+    Constructor arguments:
+
+    ``heights``
+
+        A 2D array of shape (2^k + 1, 2^k + 1) containing the heights of the grid,
+        defined from north-to-south and west-to-east. The first and last rows and
+        columns lie on the bounds. (Required)
+
+    ``bounds``
+
+        The bounds of the grid. (west, south, east, north) (Required)
+
+    Usage example::
+
+        from quantized_mesh_tile.rtin import RTIN
+        rtin = RTIN(heights, bounds=[7.0, 46.0, 7.1, 46.1])
+        for maxError in (1.0, 5.0, 20.0):
+            topology = rtin.getTopology(maxError)
+
+    """
+
+    def __init__(self, heights, bounds):
+        heights = np.asarray(heights, dtype='float64')
+        size = heights.shape[0]
+        tileSize = size - 1
+        if heights.ndim != 2 or heights.shape[1] != size or tileSize < 1 or \
+                tileSize & (tileSize - 1):
+            raise ValueError(
+                'Heights must be an array of shape (2^k + 1, 2^k + 1), got %s' % (
+                    heights.shape,))
+        self.heights = heights
+        self.bounds = bounds
+        self.size = size
+
+        west, south, east, north = bounds
+        self.lons = np.linspace(west, east, size)
+        self.lats = np.linspace(north, south, size)
+        self.cartesianVertices = LLH2ECEFGrid(self.lons, self.lats, heights)
+        self.errors = self._computeErrors()
+
+    def _triangleCoordinates(self, depth):
+        """
+        A private method returning the grid coordinates of the 3 vertices of all
+        the triangles at a given depth in the RTIN hierarchy.
+        a and b are the ends of the hypotenuse and c is the right angle vertex.
+        """
+        tileSize = self.size - 1
+        ids = np.arange(2 ** (depth + 1), 2 ** (depth + 2))
+        # Bottom-left triangle for odd ids, top-right triangle otherwise
+        isOdd = (ids & 1).astype(bool)
+        ax = np.where(isOdd, 0, tileSize)
+        ay = ax.copy()
+        bx = np.where(isOdd, tileSize, 0)
+        by = bx.copy()
+        cx = bx.copy()
+        cy = ax.copy()
+        for _ in range(depth):
+            ids >>= 1
+            mx = (ax + bx) >> 1
+            my = (ay + by) >> 1
+            isLeft = (ids & 1).astype(bool)
+            ax, ay, bx, by = (np.where(isLeft, cx, bx), np.where(isLeft, cy, by),
+                              np.where(isLeft, ax, cx), np.where(isLeft, ay, cy))
+            cx, cy = mx, my
+        return ax, ay, bx, by, cx, cy
+
+    def _computeErrors(self):
+        """
+        A private method computing, for each vertex of the grid, the maximal error
+        made when the vertex is left out of the mesh. The triangles are processed
+        one depth at a time, from the smallest to the largest, so that the error
+        of a triangle includes the errors of its children.
+        """
+        heights = self.heights
+        errors = np.zeros(heights.shape, dtype='float64')
+        tileSize = self.size - 1
+        # The smallest triangles have a hypotenuse of length 2
+        maxDepth = 2 * int(np.log2(tileSize)) - 1
+        for depth in range(maxDepth, -1, -1):
+            ax, ay, bx, by, cx, cy = self._triangleCoordinates(depth)
+            mx = (ax + bx) >> 1
+            my = (ay + by) >> 1
+            interpolated = (heights[ay, ax] + heights[by, bx]) / 2
+            middleErrors = np.abs(interpolated - heights[my, mx])
+            # Accumulate the errors of the children. The children of the
+            # smallest triangles have no middle vertex: the floored indices
+            # below point to other vertices of the grid, which are not their
+            # children. They are skipped, as in Martini (i < numParentTriangles).
+            # Keep this test even though their errors are still zero at the
+            # first depth processed: reading them would make the errors depend
+            # on the order of the depths
+            if depth < maxDepth:
+                middleErrors = np.maximum(middleErrors, np.maximum(
+                    errors[(ay + cy) >> 1, (ax + cx) >> 1],
+                    errors[(by + cy) >> 1, (bx + cx) >> 1]))
+            np.maximum.at(errors, (my, mx), middleErrors)
+        return errors
+
+    def getFaces(self, maxError):
+        """
+        Method returning the faces of the mesh for a maximal error, as an array
+        of shape (T, 3) of indices in the grid (row * (2^k + 1) + column).
+        The faces are in counter clockwise order.
+        """
+        size = self.size
+        tileSize = size - 1
+        # The 2 root triangles (a, b, c)
+        a = np.array([[0, 0], [tileSize, tileSize]])
+        b = np.array([[tileSize, tileSize], [0, 0]])
+        c = np.array([[tileSize, 0], [0, tileSize]])
+        faces = []
+        while len(a):
+            m = (a + b) >> 1
+            split = (np.abs(a - c).sum(axis=1) > 1) & \
+                (self.errors[m[:, 1], m[:, 0]] > maxError)
+            leaves = np.stack((a[~split], b[~split], c[~split]), axis=1)
+            faces.append(leaves[:, :, 1] * size + leaves[:, :, 0])
+            a, b, c, m = a[split], b[split], c[split], m[split]
+            a, b, c = np.concatenate((c, b)), np.concatenate((a, c)), \
+                np.concatenate((m, m))
+        faces = np.concatenate(faces)
+
+        # Rows go southward, make the faces counter clockwise in lon/lat
+        x = faces % size
+        y = -(faces // size)
+        cross = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - \
+            (y[:, 1] - y[:, 0]) * (x[:, 2] - x[:, 0])
+        clockWise = cross < 0
+        faces[clockWise, 1:] = faces[clockWise, :0:-1]
+        return faces
+
+    def getTopology(self, maxError, hasLighting=False):
+        """
+        Method returning a :class:`quantized_mesh_tile.topology.TerrainTopology`
+        for a maximal error.
+
+        Arguments:
+
+        ``maxError``
+
+            The maximal vertical error in meters of the grid vertices left
+            out of the mesh. (Required)
+
+        ``hasLighting``
+
+            Indicate whether unit vectors should be computed for the lighting
+            extension. Default is `False`.
+        """
+        return TerrainTopology._fromGridFaces(
+            self.lons, self.lats, self.heights, self.getFaces(maxError),
+            self.cartesianVertices, hasLighting=hasLighting)
@@ -0,0 +1,365 @@
+""" This module provides a quadric error mesh simplification for
+:class:`quantized_mesh_tile.topology.TerrainTopology` and
+:class:`quantized_mesh_tile.terrain.TerrainTile` instances.
+
+It is based on the edge collapse algorithm of Garland and Heckbert:
+https://www.cs.cmu.edu/~garland/Papers/quadrics.pdf
+
+Reference
+---------
+"""
+
+import numpy as np
+
+from .llh_ecef import LLH2ECEFArray
+from .terrain import TerrainTile
+from .topology import TerrainTopology
+
+
+def simplify(mesh, maxTriangles=None, maxError=None, bounds=None):
+    """
+    Function to simplify a terrain tile topology or a terrain tile.
+    Returns a new instance of the same class.
+
+    Edges are collapsed, the cheapest collapses first, until the number of
+    triangles or the error target is reached. The vertices of the tile edges
+    are never removed, so that the simplified tile still matches its neighbours.
+
+    Arguments:
+
+    ``mesh``
+
+        A :class:`quantized_mesh_tile.topology.TerrainTopology` or a
+        :class:`quantized_mesh_tile.terrain.TerrainTile`. (Required)
+
+    ``maxTriangles``
+
+        The number of triangles to reach. Default is `None`.
+
+    ``maxError``
+
+        The maximal geometric error in meters. The error of a vertex is the square
+        root of the sum of the squared distances to the planes of the original
+        triangles merged into this vertex. Default is `None`.
+
+    ``bounds``
+
+        The bounds of the terrain tile topology. (west, south, east, north)
+        The vertices on these bounds are never removed.
+        If not defined, the extent of the topology is used.
+        Ignored for terrain tiles, which use their edge indices.
+
+        Default is `None`.
+
+    At least one of ``maxTriangles`` and ``maxError`` must be defined.
+    If both are defined, the simplification stops as soon as one is reached.
+
+    ``maxTriangles`` is a best effort target: a collapse is rejected when it
+    would fold the mesh or flip a triangle in lon/lat, and it is tried again
+    after the neighbouring collapses. The simplification stops when no valid
+    collapse is left, with more triangles than ``maxTriangles`` if needed.
+    The number of triangles reached is the number of faces of the result.
+
+    The collapses are applied by rounds of independent collapses with array
+    operations, each round removing about a sixth of the triangles. A grid
+    of 10^6 triangles is simplified in about 20 seconds.
+    """
+    if maxTriangles is None and maxError is None:
+        raise ValueError('Either maxTriangles or maxError must be defined')
+
+    if isinstance(mesh, TerrainTile):
+        mesh._computeVerticesCoordinates()
+        vertices = np.column_stack((mesh._longs, mesh._lats, mesh._heights))
+        faces = np.asarray(mesh.indices, dtype='int').reshape(-1, 3)
+        locked = np.zeros(len(vertices), dtype=bool)
+        for edge in (mesh.westI, mesh.southI, mesh.eastI, mesh.northI):
+            locked[np.asarray(edge, dtype='int')] = True
+    elif isinstance(mesh, TerrainTopology):
+        vertices = mesh.vertices
+        faces = mesh.faces
+        if bounds is None:
+            bounds = [mesh.minLon, mesh.minLat, mesh.maxLon, mesh.maxLat]
+        west, south, east, north = bounds
+        locked = (vertices[:, 0] == west) | (vertices[:, 0] == east) | \
+            (vertices[:, 1] == south) | (vertices[:, 1] == north)
+    else:
+        raise ValueError('Only terrain tiles and topologies can be simplified')
+
+    faces = simplifyMesh(vertices, faces, locked, maxTriangles=maxTriangles,
+                         maxError=maxError)
+    topology = TerrainTopology.fromArrays(vertices[faces],
+                                          hasLighting=mesh.hasLighting)
+    if isinstance(mesh, TerrainTopology):
+        return topology
+
+    kwargs = {}
+    if mesh.hasWatermask:
+        kwargs['watermask'] = mesh.watermask
+    return TerrainTile(topology=topology, west=mesh._west, south=mesh._south,
+                       east=mesh._east, north=mesh._north, compact=mesh.compact,
+                       **kwargs)
+
+
+def simplifyMesh(vertices, faces, locked, maxTriangles=None, maxError=None):
+    """
+    Function to simplify a triangle mesh by half edge collapses, a vertex being
+    merged into one of its neighbours. Returns the remaining faces, an array of
+    shape (T, 3) referencing the original vertices.
+
+    Arguments:
+
+    ``vertices``
+
+        An array of shape (N, 3) of lon, lat, height vertices. (Required)
+
+    ``faces``
+
+        An array of shape (F, 3) of counter clockwise faces. (Required)
+
+    ``locked``
+
+        A boolean array of shape (N,), `True` for the vertices which must not
+        be removed. (Required)
+
+    See :func:`quantized_mesh_tile.simplify.simplify` for ``maxTriangles``
+    and ``maxError``.
+    """
+    vertices = np.asarray(vertices, dtype='float64').reshape(-1, 3)
+    faces = np.asarray(faces, dtype='int').reshape(-1, 3)
+    locked = np.asarray(locked, dtype=bool)
+    maxTriangles = 0 if maxTriangles is None else maxTriangles
+    maxCost = np.inf if maxError is None else maxError ** 2
+    if len(faces) <= maxTriangles:
+        return faces
+
+    # Quadrics are computed in ECEF, around the center of the mesh to keep
+    # the precision of the squared distances
+    points = LLH2ECEFArray(vertices)
+    points -= points.mean(axis=0)
+    quadrics = _computeQuadrics(points, faces)
+    planar = vertices[:, :2]
+    # Orientation of the faces in lon/lat, which collapses must preserve
+    orientations = np.sign(_cross(planar[faces[:, 0]], planar[faces[:, 1]],
+                                  planar[faces[:, 2]]))
+    count = len(vertices)
+
+    # The collapses are applied by rounds of independent collapses, from the
+    # cheapest valid collapse of each vertex
+    while len(faces) > maxTriangles:
+        edges, shared, starts = _collectEdges(faces, count)
+        u, v, costs, removed = _cheapestCollapses(
+            planar, points, quadrics, faces, orientations, locked, maxCost,
+            edges, shared, starts)
+        if not len(u):
+            break
+
+        # Only the cheapest collapses needed to reach maxTriangles compete
+        if maxTriangles:
+            needed = (len(faces) - maxTriangles + 1) // 2
+            if needed < len(u):
+                cheapest = np.argpartition(costs, needed - 1)[:needed]
+                u, v, costs, removed = \
+                    u[cheapest], v[cheapest], costs[cheapest], removed[cheapest]
+
+        # A collapse u -> v changes the faces of u and the neighbours of the
+        # vertices around u. Two collapses are independent when neither u nor
+        # v of one of them is u or a neighbour of u of the other one. The
+        # collapses cheaper than all the collapses they depend on are selected,
+        # until the collapses left all depend on a selected one
+        order = np.argsort(costs)
+        u, v, removed = u[order], v[order], removed[order]
+        independent = np.zeros(len(u), dtype=bool)
+        pending = np.arange(len(u))
+        while len(pending):
+            pendingU, pendingV = u[pending], v[pending]
+            fromRanks = np.full(count, len(u), dtype='int')
+            fromRanks[pendingU] = pending
+            toRanks = np.full(count, len(u), dtype='int')
+            np.minimum.at(toRanks, pendingV, pending)
+            fromRanks = _ringMinimum(fromRanks, edges, starts)
+            toRanks = _ringMinimum(toRanks, edges, starts)
+            cheapest = np.minimum(np.minimum(fromRanks[pendingU], toRanks[pendingU]),
+                                  fromRanks[pendingV]) == pending
+            independent[pending[cheapest]] = True
+            fromRing = _ring(pendingU[cheapest], edges, count)
+            toRing = _ring(pendingV[cheapest], edges, count)
+            pending = pending[
+                ~(fromRing[pendingU] | fromRing[pendingV] | toRing[pendingU])]
+        u, v, removed = u[independent], v[independent], removed[independent]
+        if maxTriangles:
+            # The collapses are kept while the target is not reached
+            remaining = len(faces) - maxTriangles
+            keep = np.cumsum(removed) - removed < remaining
+            u, v = u[keep], v[keep]
+
+        # The independent collapses do not share any face
+        quadrics[v] += quadrics[u]
+        remap = np.arange(count)
+        remap[u] = v
+        faces = remap[faces]
+        alive = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & \
+            (faces[:, 2] != faces[:, 0])
+        faces = faces[alive]
+        orientations = orientations[alive]
+
+    return faces
+
+
+def _collectEdges(faces, count):
+    # The directed edges of the faces sorted by their first vertex, without
+    # duplicates, the number of faces sharing each edge and the index of the
+    # first edge of each vertex
+    halfEdges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    keys, shared = np.unique(halfEdges[:, 0] * count + halfEdges[:, 1],
+                             return_counts=True)
+    a, b = keys // count, keys % count
+    edges = np.column_stack((np.concatenate((a, b)), np.concatenate((b, a))))
+    shared = np.concatenate((shared, shared))
+    order = np.argsort(edges[:, 0] * count + edges[:, 1])
+    edges, shared = edges[order], shared[order]
+    starts = np.zeros(count + 1, dtype='int')
+    np.cumsum(np.bincount(edges[:, 0], minlength=count), out=starts[1:])
+    return edges, shared, starts
+
+
+def _cheapestCollapses(planar, points, quadrics, faces, orientations, locked,
+                       maxCost, edges, shared, starts):
+    # The cheapest valid collapse u -> v of each unlocked vertex u, with its
+    # cost and the number of faces it removes
+    count = len(planar)
+    candidates = np.where(~locked[edges[:, 0]])[0]
+    u, v = edges[candidates, 0], edges[candidates, 1]
+    costs = _evaluateQuadrics(quadrics[u] + quadrics[v], points[v])
+    allowed = costs <= maxCost
+    candidates, u, v, costs = \
+        candidates[allowed], u[allowed], v[allowed], costs[allowed]
+
+    if not len(u):
+        return u, v, costs, shared[candidates]
+
+    # The faces of each vertex
+    corners = np.argsort(faces.ravel())
+    faceStarts = np.zeros(count + 1, dtype='int')
+    np.cumsum(np.bincount(faces.ravel(), minlength=count), out=faceStarts[1:])
+    keys = edges[:, 0] * count + edges[:, 1]
+
+    # The cheapest collapse of each vertex is checked first, the candidates
+    # being sorted by vertex
+    groups = np.where(np.append(True, u[1:] != u[:-1]))[0]
+    sizes = np.diff(np.append(groups, len(u)))
+    groupOf = np.repeat(np.arange(len(groups)), sizes)
+    cheapest = np.where(costs == np.repeat(np.minimum.reduceat(costs, groups),
+                                           sizes))[0]
+    cheapest = cheapest[np.append(True, np.diff(groupOf[cheapest]) > 0)]
+    valid = _validCollapses(planar, faces, orientations, edges, starts, keys,
+                            corners, faceStarts, u[cheapest], v[cheapest],
+                            shared[candidates[cheapest]])
+    selected = [cheapest[valid]]
+
+    # The other collapses of the vertices whose cheapest collapse is rejected
+    # are checked by increasing cost, until a valid one is found
+    rejected = np.zeros(len(groups), dtype=bool)
+    rejected[groupOf[cheapest[~valid]]] = True
+    others = rejected[groupOf]
+    others[cheapest] = False
+    others = np.where(others)[0]
+    others = others[np.lexsort((costs[others], u[others]))]
+    tested = np.where(np.append(True, u[others[1:]] != u[others[:-1]]))[0] \
+        if len(others) else others
+    while len(tested):
+        collapses = others[tested]
+        valid = _validCollapses(planar, faces, orientations, edges, starts, keys,
+                                corners, faceStarts, u[collapses], v[collapses],
+                                shared[candidates[collapses]])
+        selected.append(collapses[valid])
+        tested = tested[~valid] + 1
+        tested = tested[tested < len(others)]
+        tested = tested[u[others[tested]] == u[others[tested - 1]]]
+    selected = np.sort(np.concatenate(selected))
+    return u[selected], v[selected], costs[selected], \
+        shared[candidates[selected]]
+
+
+def _validCollapses(planar, faces, orientations, edges, starts, keys, corners,
+                    faceStarts, u, v, shared):
+    count = len(planar)
+    # The vertices adjacent to both u and v must be the opposite vertices of
+    # the shared faces, otherwise the mesh would fold
+    collapses, neighbours = _expand(starts, u)
+    common = (v[collapses] * count + edges[neighbours, 1])
+    positions = np.minimum(np.searchsorted(keys, common), len(keys) - 1)
+    common = np.bincount(collapses, weights=keys[positions] == common,
+                         minlength=len(u))
+    valid = common == shared
+
+    # The moved faces, the faces of u without v, must keep their orientation
+    # in lon/lat
+    collapses, indices = _expand(faceStarts, u)
+    face, corner = np.divmod(corners[indices], 3)
+    b = faces[face, (corner + 1) % 3]
+    c = faces[face, (corner + 2) % 3]
+    target = v[collapses]
+    moved = (b != target) & (c != target)
+    crosses = _cross(planar[target], planar[b], planar[c])
+    flipped = moved & ~(crosses * orientations[face] > 0)
+    valid &= np.bincount(collapses, weights=flipped, minlength=len(u)) == 0
+    return valid
+
+
+def _expand(starts, vertices):
+    # The index of the collapse and the index of each item of its vertex,
+    # for the items grouped by vertex from starts
+    counts = starts[vertices + 1] - starts[vertices]
+    collapses = np.repeat(np.arange(len(vertices)), counts)
+    offsets = np.arange(len(collapses)) - np.repeat(np.cumsum(counts) - counts,
+                                                    counts)
+    return collapses, starts[vertices][collapses] + offsets
+
+
+def _ringMinimum(values, edges, starts):
+    # The minimum of the values over each vertex and its neighbours
+    result = values.copy()
+    vertices = np.where(starts[1:] > starts[:-1])[0]
+    if len(vertices):
+        result[vertices] = np.minimum(result[vertices], np.minimum.reduceat(
+            values[edges[:, 1]], starts[vertices]))
+    return result
+
+
+def _ring(vertices, edges, count):
+    # A mask of the vertices and their neighbours
+    ring = np.zeros(count, dtype=bool)
+    ring[vertices] = True
+    ring[edges[ring[edges[:, 1]], 0]] = True
+    return ring
+
+
+def _cross(a, b, c):
+    return (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - \
+        (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+
+
+# The 10 coefficients of the symmetric 4x4 quadric of a plane (a, b, c, d)
+# aa, ab, ac, ad, bb, bc, bd, cc, cd, dd
+def _computeQuadrics(points, faces):
+    v0 = points[faces[:, 0]]
+    normals = np.cross(points[faces[:, 1]] - v0, points[faces[:, 2]] - v0)
+    norms = np.sqrt(np.sum(normals ** 2, axis=1))[:, np.newaxis]
+    # Degenerate faces have no plane
+    np.divide(normals, norms, out=normals, where=norms > 0)
+    normals[norms[:, 0] == 0] = 0.0
+    a, b, c = normals[:, 0], normals[:, 1], normals[:, 2]
+    d = -np.sum(normals * v0, axis=1)
+    faceQuadrics = np.column_stack((a * a, a * b, a * c, a * d, b * b,
+                                    b * c, b * d, c * c, c * d, d * d))
+    quadrics = np.zeros((len(points), 10), dtype='float64')
+    np.add.at(quadrics, faces.ravel(), np.repeat(faceQuadrics, 3, axis=0))
+    return quadrics
+
+
+def _evaluateQuadrics(q, p):
+    x, y, z = p[:, 0], p[:, 1], p[:, 2]
+    return np.maximum(
+        q[:, 0] * x * x + 2 * q[:, 1] * x * y + 2 * q[:, 2] * x * z +
+        2 * q[:, 3] * x + q[:, 4] * y * y + 2 * q[:, 5] * y * z +
+        2 * q[:, 6] * y + q[:, 7] * z * z + 2 * q[:, 8] * z + q[:, 9], 0.0)
@@ -8,15 +8,20 @@ Reference
 
 import gzip
 import io
+import mmap
 import os
+import zlib
 from collections import OrderedDict
+from struct import calcsize, pack_into, unpack_from
+
+import numpy as np
 
 from . import horizon_occlusion_point as occ
 from .bbsphere import BoundingSphere
 from .topology import TerrainTopology
-from .utils import (decodeIndices, encodeIndices, gzipFileObject, octDecode,
-                    octEncode, packEntry, packIndices, ungzipFileObject,
-                    unpackEntry, zigZagDecode, zigZagEncode)
+from .utils import (GZIP_MAGIC, decodeIndices, encodeIndices, gzipFileObject,
+                    isGzipped, octDecodeArray, octEncodeArray, zigZagDecode,
+                    zigZagEncode)
 
 # For a tile of 256px * 256px
 TILEPXS = 65536
@@ -26,6 +31,38 @@ def lerp(p, q, time):
     return ((1.0 - time) * p) + (time * q)
 
 
+def roundToInt(value):
+    # Rounds half to even like round(), for a number or an array
+    if np.ndim(value):
+        return np.rint(value).astype('int32')
+    return int(round(value))
+
+
+class LazySection(object):
+    """
+    A descriptor for the attributes of a terrain tile which can be decoded
+    on first access. See ``lazy`` in
+    :meth:`quantized_mesh_tile.terrain.TerrainTile.fromBytesIO`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.attributeName = '_' + name
+
+    def __get__(self, tile, owner=None):
+        if tile is None:
+            return self
+        if self.name in tile._lazySections:
+            self.__set__(tile, tile._decodeSection(self.name))
+        return getattr(tile, self.attributeName)
+
+    def __set__(self, tile, value):
+        if tile._lazySections.pop(self.name, None) is not None:
+            if not tile._lazySections:
+                tile._lazyData = None
+        setattr(tile, self.attributeName, value)
+
+
 class TerrainTile(object):
     """
     The main class to read and write a terrain tile.
@@ -54,14 +91,35 @@ class TerrainTile(object):
         :class:`quantized_mesh_tile.topology.TerrainTopology`. Default is `None`.
 
     ``watermask``
-        A water mask list (Optional). Adds rendering water effect.
-        The water mask list is either one byte, `[0]` for land and `[255]` for
-        water, either a list of 256*256 values ranging from 0 to 255.
+        A water mask list or array (Optional). Adds rendering water effect.
+        The water mask is either one byte, `[0]` for land and `[255]` for
+        water, either 256*256 values ranging from 0 to 255 (a list of 256 rows or
+        an array of shape (256, 256)). It is stored as an array of type uint8 of
+        shape (1, 1) or (256, 256). A water mask which is entirely land or entirely
+        water is written as a single byte.
         Values in the mask are defined from north-to-south and west-to-east.
         Per default no watermask is applied. Note that the water mask effect depends on
         the texture of the raster layer drapped over your terrain.
         Default is `[]`.
 
+    ``sortEdges``
+
+        When the tile is created from a topology, sort the vertices on the edges
+        of the tile. See :meth:`fromTerrainTopology`. Default is `False`.
+
+    ``exactBoundingSphere``
+
+        When the tile is created from a topology, compute the minimal bounding
+        sphere. See :meth:`fromTerrainTopology`. Default is `False`.
+
+    ``compact``
+
+        Store the vertices, the indices, the edge indices and the computed
+        coordinates as typed arrays (uint16 or uint32 for the indices depending on
+        the number of vertices, uint16 for the quantized vertices, float64 for the
+        coordinates) instead of lists of numbers. Arrays support ``len``,
+        indexing, iteration and ``tolist()``. Default is `False`.
+
     Usage examples::
 
         from quantized_mesh_tile.terrain import TerrainTile
@@ -169,18 +227,44 @@ class TerrainTile(object):
         ['xy', 'B']
     ])
 
+    _headerFormat = '<%s' % ''.join(quantizedMeshHeader.values())
+    _headerAndVertexCountFormat = _headerFormat + vertexData['vertexCount']
+
     BYTESPLIT = 65636
 
     # min and max quantized values for indices
     MIN = 0.0
     MAX = 32767.0
 
+    __slots__ = (
+        '_lazySections', '_lazyData', '_west', '_east', '_south', '_north',
+        '_longs', '_lats', '_heights', '_triangles', '_workingUnitLongitude',
+        '_workingUnitLatitude', '_deltaHeight', 'EPSG', 'compact', 'hasLighting',
+        'hasWatermask', 'header', '_u', '_v', '_h', '_indices', '_westI',
+        '_southI', '_eastI', '_northI', '_vLight', '_watermask', '__weakref__'
+    )
+
+    u = LazySection('u')
+    v = LazySection('v')
+    h = LazySection('h')
+    indices = LazySection('indices')
+    westI = LazySection('westI')
+    southI = LazySection('southI')
+    eastI = LazySection('eastI')
+    northI = LazySection('northI')
+    vLight = LazySection('vLight')
+    watermask = LazySection('watermask')
+
     # Coordinates are given in lon/lat WSG84
     def __init__(self, *args, **kwargs):
+        # Sections of a tile read in lazy mode which have not been decoded yet
+        self._lazySections = {}
+        self._lazyData = None
         self._west = kwargs.get('west', -1.0)
         self._east = kwargs.get('east', 1.0)
         self._south = kwargs.get('south', -1.0)
         self._north = kwargs.get('north', 1.0)
+        self.compact = kwargs.get('compact', False)
         self._longs = []
         self._lats = []
         self._heights = []
@@ -192,8 +276,9 @@ class TerrainTile(object):
 
         # Extensions
         self.vLight = []
-        self.watermask = kwargs.get('watermask', [])
-        self.hasWatermask = kwargs.get('hasWatermask', bool(self.watermask))
+        watermask = kwargs.get('watermask', [])
+        self.watermask = self._watermaskToArray(watermask) if len(watermask) else []
+        self.hasWatermask = kwargs.get('hasWatermask', len(self.watermask) > 0)
 
         self.header = OrderedDict()
         for k in TerrainTile.quantizedMeshHeader.keys():
@@ -209,7 +294,34 @@ class TerrainTile(object):
 
         topology = kwargs.get('topology')
         if topology is not None:
-            self.fromTerrainTopology(topology)
+            self.fromTerrainTopology(
+                topology, sortEdges=kwargs.get('sortEdges', False),
+                exactBoundingSphere=kwargs.get('exactBoundingSphere', False))
+
+    def __getstate__(self):
+        """
+        Returns the state of the tile for pickle and copy. The sections which have
+        not been decoded yet are kept encoded, in a copy of the data of the tile
+        instead of a view on a memory mapped file or on a buffer.
+        """
+        # The attributes of the subclasses are in their slots or in __dict__
+        state = dict(getattr(self, '__dict__', {}))
+        for cls in type(self).__mro__:
+            slots = cls.__dict__.get('__slots__', ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            for name in slots:
+                if name not in ('__dict__', '__weakref__') and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        # The copy decodes its sections independently
+        state['_lazySections'] = OrderedDict(self._lazySections)
+        if self._lazyData is not None:
+            state['_lazyData'] = bytes(self._lazyData)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def __repr__(self):
         msg = 'Header: %s\n' % self.header
@@ -295,23 +407,52 @@ class TerrainTile(object):
         """
         A private method to compute the vertices coordinates.
         """
-        if not self._longs:
-            for u in self.u:
-                self._longs.append(
-                    lerp(self._west, self._east, u / self.MAX))
-            for v in self.v:
-                self._lats.append(
-                    lerp(self._south, self._north, v / self.MAX))
-            for h in self.h:
-                self._heights.append(
-                    lerp(
-                        self.header['minimumHeight'],
-                        self.header['maximumHeight'],
-                        h / self.MAX
-                    )
-                )
+        if len(self._longs) == 0:
+            self._longs = lerp(
+                self._west, self._east, np.asarray(self.u, dtype='float64') / self.MAX)
+            self._lats = lerp(
+                self._south, self._north, np.asarray(self.v, dtype='float64') / self.MAX)
+            self._heights = lerp(
+                self.header['minimumHeight'],
+                self.header['maximumHeight'],
+                np.asarray(self.h, dtype='float64') / self.MAX
+            )
+            if not self.compact:
+                self._longs = self._longs.tolist()
+                self._lats = self._lats.tolist()
+                self._heights = self._heights.tolist()
+
+    @staticmethod
+    def readHeader(f):
+        """
+        A method to read only the header of a terrain tile, without decoding the
+        rest of the tile. Returns an ordered dictionary with the values of the
+        `quantizedMeshHeader` and the `vertexCount`.
+
+        Arguments:
+
+        ``f``
 
-    def fromBytesIO(self, f, hasLighting=False, hasWatermask=False):
+            A file-like object positioned at the beginning of the terrain data.
+            (Required)
+        """
+        return TerrainTile._unpackHeader(
+            f.read(calcsize(TerrainTile._headerAndVertexCountFormat)))
+
+    @staticmethod
+    def _unpackHeader(data):
+        """
+        A private method to unpack the header and the vertex count from the
+        beginning of a buffer.
+        """
+        if len(data) < calcsize(TerrainTile._headerAndVertexCountFormat):
+            raise Exception('Unexpected end of file while reading the tile header')
+        values = unpack_from(TerrainTile._headerAndVertexCountFormat, data)
+        keys = list(TerrainTile.quantizedMeshHeader.keys()) + ['vertexCount']
+        return OrderedDict(zip(keys, values))
+
+    def fromBytesIO(self, f, hasLighting=None, hasWatermask=None, lazy=False,
+                    gzipped=None):
         """
         A method to read a terrain tile content.
 
@@ -323,147 +464,231 @@ class TerrainTile(object):
 
         ``hasLighting``
 
-            Indicate if the tile contains lighting information. Default is ``False``.
+            Indicate if the lighting extension should be read. If ``None``, the
+            extension is read if it is present in the tile. If ``False``, the
+            extension is skipped. Default is ``None``.
 
         ``hasWatermask``
 
-            Indicate if the tile contains watermask information. Default is ``False``.
+            Indicate if the watermask extension should be read. If ``None``, the
+            extension is read if it is present in the tile. If ``False``, the
+            extension is skipped. Default is ``None``.
+
+        ``lazy``
+
+            Only locate the sections of the tile and decode each of them
+            (`u`, `v`, `h`, `indices`, `westI`, `southI`, `eastI`, `northI`,
+            `vLight` and `watermask`) when it is first accessed.
+            Sections which are never accessed are written back as is.
+            Default is ``False``.
+
+        ``gzipped``
+
+            Indicate if the content is gzipped. If ``None``, gzip compression is
+            detected from the magic number. Default is ``None``.
         """
-        self.hasLighting = hasLighting
-        self.hasWatermask = hasWatermask
+        self.fromBuffer(f.read(), hasLighting=hasLighting,
+                        hasWatermask=hasWatermask, lazy=lazy, gzipped=gzipped)
+
+    def fromBuffer(self, data, hasLighting=None, hasWatermask=None, lazy=False,
+                   gzipped=None):
+        """
+        A method to read a terrain tile content from a buffer (bytes, bytearray,
+        mmap...). The sections of the tile are decoded from views on the buffer,
+        without copying it.
+
+        Arguments:
+
+        ``data``
+
+            An object supporting the buffer protocol containing the terrain data.
+            (Required)
+
+        ``hasLighting``
+
+            Indicate if the lighting extension should be read. If ``None``, the
+            extension is read if it is present in the tile. If ``False``, the
+            extension is skipped. Default is ``None``.
+
+        ``hasWatermask``
+
+            Indicate if the watermask extension should be read. If ``None``, the
+            extension is read if it is present in the tile. If ``False``, the
+            extension is skipped. Default is ``None``.
+
+        ``lazy``
+
+            Decode the sections of the tile on first access.
+            See :meth:`fromBytesIO`. Default is ``False``.
+
+        ``gzipped``
+
+            Indicate if the content is gzipped. If ``None``, gzip compression is
+            detected from the magic number. Default is ``None``.
+        """
+        data = memoryview(data).cast('B')
+        if gzipped or (gzipped is None and data[:len(GZIP_MAGIC)] == GZIP_MAGIC):
+            try:
+                data = memoryview(gzip.decompress(data))
+            except (OSError, EOFError, zlib.error):
+                # The header of an uncompressed tile may start with the magic number
+                if gzipped:
+                    raise
         # Header
-        for k, v in TerrainTile.quantizedMeshHeader.items():
-            self.header[k] = unpackEntry(f, v)
+        header = TerrainTile._unpackHeader(data)
+        vertexCount = header.pop('vertexCount')
+        self.header.update(header)
+
+        self.vLight = []
+        self.watermask = []
+        self._indexSections(
+            data[calcsize(TerrainTile._headerAndVertexCountFormat):], vertexCount,
+            hasLighting is not False, hasWatermask is not False)
+        self.hasLighting = 'vLight' in self._lazySections
+        self.hasWatermask = 'watermask' in self._lazySections
+        if not lazy:
+            for name in list(self._lazySections.keys()):
+                getattr(self, name)
+
+    def _indexSections(self, data, vertexCount, readLighting=True, readWatermask=True):
+        """
+        A private method to record the position of each section of the tile in
+        the data following the header (and the vertex count).
+        Extensions are read until the end of the data, unknown extensions
+        (and the ones which should not be read) are skipped.
+        """
+        self._lazyData = data
+        self._lazySections = OrderedDict()
+        offset = 0
+
+        def addSection(name, count, entry, length=None):
+            size = count * calcsize(entry)
+            if offset + size > len(data):
+                raise Exception('Unexpected end of file while reading %s' % name)
+            self._lazySections[name] = (
+                offset, count, entry, count if length is None else length)
+            return offset + size
+
+        def readEntry(entry):
+            return unpack_from('<%s' % entry, data, offset)[0], offset + calcsize(entry)
 
         # Vertices
-        vertexCount = unpackEntry(f, TerrainTile.vertexData['vertexCount'])
-        for ud in self._iterUnpackAndDecodeVertices(
-                f, vertexCount, TerrainTile.vertexData['uVertexCount']):
-            self.u.append(ud)
-        for vd in self._iterUnpackAndDecodeVertices(
-                f, vertexCount, TerrainTile.vertexData['vVertexCount']):
-            self.v.append(vd)
-        for hd in self._iterUnpackAndDecodeVertices(
-                f, vertexCount, TerrainTile.vertexData['heightVertexCount']):
-            self.h.append(hd)
+        offset = addSection('u', vertexCount, TerrainTile.vertexData['uVertexCount'])
+        offset = addSection('v', vertexCount, TerrainTile.vertexData['vVertexCount'])
+        offset = addSection(
+            'h', vertexCount, TerrainTile.vertexData['heightVertexCount'])
 
         # Indices
         meta = TerrainTile.indexData16
         if vertexCount > TerrainTile.BYTESPLIT:
             meta = TerrainTile.indexData32
-        triangleCount = unpackEntry(f, meta['triangleCount'])
-        ind = [
-            index for index
-            in self._iterUnpackIndices(f, triangleCount * 3, meta['indices'])]
-        self.indices = decodeIndices(ind)
+        triangleCount, offset = readEntry(meta['triangleCount'])
+        offset = addSection('indices', triangleCount * 3, meta['indices'])
 
         meta = TerrainTile.EdgeIndices16
         if vertexCount > TerrainTile.BYTESPLIT:
-            meta = TerrainTile.indexData32
+            meta = TerrainTile.EdgeIndices32
         # Edges (vertices on the edge of the tile)
-        westIndicesCount = unpackEntry(f, meta['westVertexCount'])
-        for wi in self._iterUnpackIndices(f, westIndicesCount, meta['westIndices']):
-            self.westI.append(wi)
+        for edge in ('west', 'south', 'east', 'north'):
+            edgeIndicesCount, offset = readEntry(meta[edge + 'VertexCount'])
+            offset = addSection(
+                edge + 'I', edgeIndicesCount, meta[edge + 'Indices'])
+
+        meta = TerrainTile.ExtensionHeader
+        while offset < len(data):
+            extensionId, offset = readEntry(meta['extensionId'])
+            extensionLength, offset = readEntry(meta['extensionLength'])
+            if extensionId == 1 and readLighting:
+                offset = addSection(
+                    'vLight', extensionLength,
+                    TerrainTile.OctEncodedVertexNormals['xy'], extensionLength // 2)
+            elif extensionId == 2 and readWatermask:
+                if extensionLength not in (1, TILEPXS):
+                    raise Exception(
+                        'Unexpected size for the watermask: %s' % extensionLength)
+                offset = addSection(
+                    'watermask', extensionLength, TerrainTile.WaterMask['xy'],
+                    1 if extensionLength == 1 else 256)
+            else:
+                # Unknown extension (or extension which should not be read)
+                if offset + extensionLength > len(data):
+                    raise Exception(
+                        'Unexpected end of file while reading extension %s' % (
+                            extensionId))
+                offset += extensionLength
 
-        southIndicesCount = unpackEntry(f, meta['southVertexCount'])
-        for si in self._iterUnpackIndices(f, southIndicesCount, meta['southIndices']):
-            self.southI.append(si)
+        if offset != len(data):
+            raise Exception('Should have reached end of file, but didn\'t')
 
-        eastIndicesCount = unpackEntry(f, meta['eastVertexCount'])
-        for ei in self._iterUnpackIndices(f, eastIndicesCount, meta['eastIndices']):
-            self.eastI.append(ei)
+    def _rawSection(self, name):
+        """
+        A private method returning the encoded bytes of a section which has not
+        been decoded yet (or None).
+        """
+        section = self._lazySections.get(name)
+        if section is not None:
+            offset, count, entry, length = section
+            return memoryview(self._lazyData)[offset:offset + count * calcsize(entry)]
 
-        northIndicesCount = unpackEntry(f, meta['northVertexCount'])
-        for ni in self._iterUnpackIndices(f, northIndicesCount, meta['northIndices']):
-            self.northI.append(ni)
+    def _sectionLength(self, name):
+        """
+        A private method returning the length of a tile attribute without decoding it.
+        """
+        section = self._lazySections.get(name)
+        if section is not None:
+            return section[3]
+        return len(getattr(self, name))
 
-        if self.hasLighting:
-            # One byte of padding
-            # Light extension header
-            meta = TerrainTile.ExtensionHeader
-            extensionId = unpackEntry(f, meta['extensionId'])
-            if extensionId == 1:
-                extensionLength = unpackEntry(f, meta['extensionLength'])
-
-                for xy in self._iterUnpackAndDecodeLight(
-                        f, extensionLength, TerrainTile.OctEncodedVertexNormals['xy']):
-                    self.vLight.append(xy)
-
-        if self.hasWatermask:
-            meta = TerrainTile.ExtensionHeader
-            extensionId = unpackEntry(f, meta['extensionId'])
-            if extensionId == 2:
-                extensionLength = unpackEntry(f, meta['extensionLength'])
-                for row in self._iterUnpackWatermaskRow(
-                        f, extensionLength, TerrainTile.WaterMask['xy']):
-                    self.watermask.append(row)
-
-        data = f.read(1)
-        if data:
-            raise Exception('Should have reached end of file, but didn\'t')
+    def _decodeSection(self, name):
+        """
+        A private method to decode a section of the tile recorded by _indexSections.
+        """
+        offset, count, entry, length = self._lazySections[name]
+        values = np.frombuffer(
+            self._lazyData, dtype='<%s' % entry, count=count, offset=offset)
+        if name in ('u', 'v', 'h'):
+            return self._decodeVertices(values)
+        elif name == 'indices':
+            indices = decodeIndices(values)
+            return indices.astype(entry) if self.compact else indices
+        elif name == 'vLight':
+            return self._decodeLight(values)
+        elif name == 'watermask':
+            return self._decodeWatermask(values)
+        return values.astype(entry) if self.compact else values.tolist()
 
     @staticmethod
-    def _iterUnpackAndDecodeVertices(f, vertexCount, structType):
+    def _decodeVertices(values):
         """
-        A private method to itertatively unpack and decode indices.
+        A private method to decode a whole vertex section at once.
+        Returns an array of quantized values of type uint16.
         """
-        i = 0
         # Delta decoding
-        delta = 0
-        while i != vertexCount:
-            delta += zigZagDecode(unpackEntry(f, structType))
-            yield delta
-            i += 1
+        return np.cumsum(
+            zigZagDecode(values.astype('int32')), dtype='int32').astype('uint16')
 
     @staticmethod
-    def _iterUnpackIndices(f, indicesCount, structType):
+    def _decodeLight(values):
         """
-        A private method to iteratively unpack indices
+        A private method to decode the oct encoded light vectors.
+        Returns an array of unit vectors of shape (N, 3).
         """
-        i = 0
-        while i != indicesCount:
-            yield unpackEntry(f, structType)
-            i += 1
-
-    @staticmethod
-    def _iterUnpackAndDecodeLight(f, extensionLength, structType):
-        """
-        A private method to iteratively unpack light vector.
-        """
-        i = 0
-        xyCount = extensionLength / 2
-        while i != xyCount:
-            yield octDecode(
-                unpackEntry(
-                    f, structType),
-                unpackEntry(
-                    f, structType)
-            )
-            i += 1
+        return octDecodeArray(values[:len(values) // 2 * 2])
 
     @staticmethod
-    def _iterUnpackWatermaskRow(f, extensionLength, structType):
-        """
-        A private method to iteratively unpack watermask rows
-        """
-        i = 0
-        xyCount = 0
-        row = []
-        while xyCount != extensionLength:
-            row.append(unpackEntry(f, structType))
-            if i == 255:
-                yield row
-                i = 0
-                row = []
-            else:
-                i += 1
-            xyCount += 1
-        if row:
-            yield row
+    def _decodeWatermask(values):
+        """
+        A private method to decode the watermask into an array of shape (256, 256)
+        (from north to south and west to east) or (1, 1) for uniform tiles.
+        """
+        if len(values) == 1:
+            return values.reshape(1, 1).copy()
+        return values.reshape(256, 256).copy()
 
-    def fromFile(self, filePath, hasLighting=False, hasWatermask=False, gzipped=False):
+    def fromFile(self, filePath, hasLighting=None, hasWatermask=None, gzipped=None,
+                 lazy=False):
         """
-        A method to read a terrain tile file. It is assumed that the tile unzipped.
+        A method to read a terrain tile file.
 
         Arguments:
 
@@ -473,21 +698,41 @@ class TerrainTile(object):
 
         ``hasLighting``
 
-            Indicate if the tile contains lighting information. Default is ``False``.
+            Indicate if the lighting extension should be read. If ``None``, the
+            extension is read if it is present in the tile. If ``False``, the
+            extension is skipped. Default is ``None``.
 
         ``hasWatermask``
 
-            Indicate if the tile contains watermask information. Default is ``False``.
+            Indicate if the watermask extension should be read. If ``None``, the
+            extension is read if it is present in the tile. If ``False``, the
+            extension is skipped. Default is ``None``.
 
         ``gzipped``
 
-            Indicate if the tile content is gzipped. Default is ``False``.
+            Indicate if the tile content is gzipped. If ``None``, gzip compression
+            is detected from the magic number. Default is ``None``.
+
+        ``lazy``
+
+            Decode the sections of the tile on first access.
+            See :meth:`fromBytesIO`. Default is ``False``.
         """
         with open(filePath, 'rb') as f:
-            if gzipped:
-                f = ungzipFileObject(f)
-            self.fromBytesIO(f, hasLighting=hasLighting,
-                             hasWatermask=hasWatermask)
+            if gzipped is None:
+                gzipped = None if isGzipped(f) else False
+            if gzipped is not False:
+                # Decompress once, the sections are views on the decompressed data
+                data = f.read()
+            else:
+                try:
+                    # The sections are views on the memory mapped file
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (ValueError, OSError):
+                    # Empty files and special files cannot be mapped
+                    data = f.read()
+        self.fromBuffer(data, hasLighting=hasLighting,
+                        hasWatermask=hasWatermask, lazy=lazy, gzipped=gzipped)
 
     def toBytesIO(self, gzipped=False):
         """
@@ -546,22 +791,25 @@ class TerrainTile(object):
             self._deltaHeight = maxHeight - minHeight
         return self._deltaHeight
 
+    def _getIndexDtype(self):
+        return 'uint32' if len(self.u) > TerrainTile.BYTESPLIT else 'uint16'
+
     def _quantizeLatitude(self, latitude):
-        return int(round((latitude - self._south) *
-                         self._getWorkingUnitLatitude()))
+        return roundToInt((latitude - self._south) *
+                          self._getWorkingUnitLatitude())
 
     def _quantizeLongitude(self, longitude):
-        return int(round((longitude - self._west) *
-                         self._getWorkingUnitLongitude()))
+        return roundToInt((longitude - self._west) *
+                          self._getWorkingUnitLongitude())
 
     def _quantizeHeight(self, height):
         deniv = self._getDeltaHeight()
         # In case a tile is completely flat
         if deniv == 0:
-            h = 0
+            h = np.zeros(np.shape(height), dtype='int32') if np.ndim(height) else 0
         else:
             workingUnitHeight = self.MAX / deniv
-            h = int(round((height - self.header['minimumHeight']) * workingUnitHeight))
+            h = roundToInt((height - self.header['minimumHeight']) * workingUnitHeight)
         return h
 
     def _dequantizeHeight(self, h):
@@ -575,123 +823,226 @@ class TerrainTile(object):
                     self.header['maximumHeight'],
                     h / self.MAX)
 
+    def getByteSize(self):
+        """
+        A method to compute the exact size in bytes of the encoded terrain tile
+        (uncompressed).
+        """
+        vertexCount = self._sectionLength('u')
+        indexSize = 4 if vertexCount > TerrainTile.BYTESPLIT else 2
+        size = calcsize(TerrainTile._headerFormat)
+        # Vertices
+        size += 4 + 3 * 2 * vertexCount
+        # Indices
+        size += 4 + indexSize * self._sectionLength('indices')
+        # Edges
+        size += 4 * 4 + indexSize * sum(
+            self._sectionLength(name) for name in ('westI', 'southI', 'eastI', 'northI'))
+        # Extensions
+        extensionHeaderSize = calcsize('<BI')
+        if self._sectionLength('vLight') > 0:
+            size += extensionHeaderSize + 2 * vertexCount
+        watermask = self._getWatermaskData()
+        if watermask is not None:
+            size += extensionHeaderSize + len(watermask)
+        return size
+
+    def toBuffer(self, buffer=None, offset=0):
+        """
+        A method to write the terrain tile data to a single buffer.
+        Returns a memoryview on the written bytes.
+
+        Arguments:
+
+        ``buffer``
+
+            A writable buffer (bytearray, memoryview, mmap...) that can be reused
+            between tiles. It must hold at least ``offset + getByteSize()`` bytes.
+            If not defined, a new bytearray of the exact size is allocated.
+            Default is ``None``.
+
+        ``offset``
+
+            The position in the buffer at which the tile is written. Default is ``0``.
+        """
+        size = self.getByteSize()
+        if buffer is None:
+            buffer = bytearray(size)
+        buff = memoryview(buffer).cast('B')
+        if buff.readonly:
+            raise ValueError('The provided buffer is not writable')
+        if len(buff) < offset + size:
+            raise ValueError(
+                'Buffer too small: %s bytes required, got %s' % (
+                    offset + size, len(buff) - offset))
+        end = self._writeInto(buff, offset)
+        if end - offset != size:
+            raise Exception('Unexpected encoded size: %s instead of %s' % (
+                end - offset, size))
+        return buff[offset:end]
+
     def _writeTo(self, f):
         """
         A private method to write the terrain tile to a file or file-like object.
         """
+        f.write(self.toBuffer())
+
+    @staticmethod
+    def _packArrayInto(buff, offset, entry, values):
+        """
+        A private method to copy an array of values at a given offset of a buffer.
+        Returns the offset following the written data.
+        """
+        if isinstance(values, memoryview):
+            # Section which has not been decoded, copy the encoded bytes
+            buff[offset:offset + len(values)] = values
+            return offset + len(values)
+        values = np.asarray(values)
+        dtype = np.dtype('<%s' % entry)
+        count = values.size
+        if count and dtype.kind in 'iu':
+            # NumPy would silently wrap the values out of range
+            info = np.iinfo(dtype)
+            if values.min() < info.min or values.max() > info.max:
+                raise ValueError(
+                    'Values of type %s must be between %s and %s, got %s to %s' % (
+                        dtype.name, info.min, info.max, values.min(), values.max()))
+        np.frombuffer(buff, dtype=dtype, count=count, offset=offset)[:] = values.ravel()
+        return offset + count * dtype.itemsize
+
+    @staticmethod
+    def _encodeVertices(values):
+        """
+        A private method to delta and zig-zag encode quantized vertex values.
+        """
+        values = np.asarray(values, dtype='int32')
+        deltas = np.empty_like(values)
+        deltas[:1] = values[:1]
+        np.subtract(values[1:], values[:-1], out=deltas[1:])
+        return zigZagEncode(deltas)
+
+    def _getWatermaskData(self):
+        """
+        A private method to flatten the watermask into bytes (1 or 256 * 256 values).
+        Watermasks which are entirely land or entirely water are collapsed into a
+        single byte. Returns None if the tile has no watermask.
+        """
+        raw = self._rawSection('watermask')
+        if raw is not None:
+            watermask = np.frombuffer(raw, dtype='uint8')
+        elif len(self.watermask) == 0:
+            return None
+        else:
+            watermask = self._watermaskToArray(self.watermask).ravel()
+        if len(watermask) == TILEPXS and watermask[0] in (0, 255) and np.all(
+                watermask == watermask[0]):
+            return watermask[:1]
+        return watermask
+
+    @staticmethod
+    def _watermaskToArray(watermask):
+        """
+        A private method to convert a watermask (list of rows, flat list or array)
+        into an array of type uint8 of shape (256, 256) or (1, 1).
+        """
+        if np.size(watermask) == 1 and np.ravel(
+                np.asarray(watermask, dtype='object'))[0] is None:
+            return np.zeros((1, 1), dtype='uint8')
+        if not isinstance(watermask, np.ndarray) and len(watermask) == 256:
+            # From North to South
+            for row in watermask:
+                if np.size(row) != 256:
+                    raise Exception(
+                        'Unexpected number of columns for the watermask: %s' % (
+                            np.size(row))
+                    )
+        watermask = np.asarray(watermask, dtype='uint8')
+        if watermask.size == 1:
+            return watermask.reshape(1, 1)
+        if watermask.size != TILEPXS or watermask.shape not in (
+                (TILEPXS,), (256, 256)):
+            raise Exception(
+                'Unexpected shape for the watermask: %s' % (watermask.shape,))
+        # From West to East
+        return watermask.reshape(256, 256)
+
+    def _writeInto(self, buff, offset):
+        """
+        A private method to encode the terrain tile into a byte memoryview.
+        Returns the offset following the written data.
+        """
         # Header
-        for k, v in TerrainTile.quantizedMeshHeader.items():
-            f.write(packEntry(v, self.header[k]))
+        pack_into(TerrainTile._headerFormat, buff, offset, *[
+            self.header[k] for k in TerrainTile.quantizedMeshHeader.keys()])
+        offset += calcsize(TerrainTile._headerFormat)
 
-        # Delta decoding
-        vertexCount = len(self.u)
         # Vertices
-        f.write(packEntry(TerrainTile.vertexData['vertexCount'], vertexCount))
-        # Move the initial value
-        f.write(
-            packEntry(
-                TerrainTile.vertexData['uVertexCount'], zigZagEncode(self.u[0]))
-        )
-        for i in range(0, vertexCount - 1):
-            ud = self.u[i + 1] - self.u[i]
-            f.write(
-                packEntry(TerrainTile.vertexData['uVertexCount'], zigZagEncode(ud)))
-        f.write(
-            packEntry(
-                TerrainTile.vertexData['uVertexCount'], zigZagEncode(self.v[0]))
-        )
-        for i in range(0, vertexCount - 1):
-            vd = self.v[i + 1] - self.v[i]
-            f.write(
-                packEntry(TerrainTile.vertexData['vVertexCount'], zigZagEncode(vd)))
-        f.write(
-            packEntry(
-                TerrainTile.vertexData['uVertexCount'], zigZagEncode(self.h[0]))
-        )
-        for i in range(0, vertexCount - 1):
-            hd = self.h[i + 1] - self.h[i]
-            f.write(
-                packEntry(
-                    TerrainTile.vertexData['heightVertexCount'], zigZagEncode(hd))
-            )
+        vertexCount = self._sectionLength('u')
+        pack_into('<%s' % TerrainTile.vertexData['vertexCount'], buff, offset,
+                  vertexCount)
+        offset += 4
+        for name, key in (('u', 'uVertexCount'), ('v', 'vVertexCount'),
+                          ('h', 'heightVertexCount')):
+            values = self._rawSection(name)
+            if values is None:
+                values = self._encodeVertices(getattr(self, name))
+            offset = self._packArrayInto(
+                buff, offset, TerrainTile.vertexData[key], values)
 
         # Indices
         meta = TerrainTile.indexData16
         if vertexCount > TerrainTile.BYTESPLIT:
             meta = TerrainTile.indexData32
 
-        f.write(packEntry(meta['triangleCount'], len(self.indices) // 3))
-        ind = encodeIndices(self.indices)
-        packIndices(f, meta['indices'], ind)
+        pack_into('<%s' % meta['triangleCount'], buff, offset,
+                  self._sectionLength('indices') // 3)
+        offset += 4
+        values = self._rawSection('indices')
+        if values is None:
+            values = encodeIndices(self.indices)
+        offset = self._packArrayInto(buff, offset, meta['indices'], values)
 
         meta = TerrainTile.EdgeIndices16
         if vertexCount > TerrainTile.BYTESPLIT:
             meta = TerrainTile.EdgeIndices32
 
-        f.write(packEntry(meta['westVertexCount'], len(self.westI)))
-        for wi in self.westI:
-            f.write(packEntry(meta['westIndices'], wi))
-
-        f.write(packEntry(meta['southVertexCount'], len(self.southI)))
-        for si in self.southI:
-            f.write(packEntry(meta['southIndices'], si))
-
-        f.write(packEntry(meta['eastVertexCount'], len(self.eastI)))
-        for ei in self.eastI:
-            f.write(packEntry(meta['eastIndices'], ei))
-
-        f.write(packEntry(meta['northVertexCount'], len(self.northI)))
-        for ni in self.northI:
-            f.write(packEntry(meta['northIndices'], ni))
+        for edge in ('west', 'south', 'east', 'north'):
+            pack_into('<%s' % meta[edge + 'VertexCount'], buff, offset,
+                      self._sectionLength(edge + 'I'))
+            offset += 4
+            values = self._rawSection(edge + 'I')
+            if values is None:
+                values = getattr(self, edge + 'I')
+            offset = self._packArrayInto(
+                buff, offset, meta[edge + 'Indices'], values)
 
         # Extension header for light
-        if len(self.vLight) > 0:
+        meta = TerrainTile.ExtensionHeader
+        extensionHeaderFormat = '<%s%s' % (meta['extensionId'], meta['extensionLength'])
+        if self._sectionLength('vLight') > 0:
             self.hasLighting = True
-            meta = TerrainTile.ExtensionHeader
             # Extension header ID is 1 for lightening
-            f.write(packEntry(meta['extensionId'], 1))
             # Unsigned char size len is 1
-            f.write(packEntry(meta['extensionLength'], 2 * vertexCount))
-
-            metaV = TerrainTile.OctEncodedVertexNormals
-            for i in range(0, vertexCount):
-                x, y = octEncode(self.vLight[i])
-                f.write(packEntry(metaV['xy'], x))
-                f.write(packEntry(metaV['xy'], y))
-
-        if self.watermask:
+            pack_into(extensionHeaderFormat, buff, offset, 1, 2 * vertexCount)
+            offset += calcsize(extensionHeaderFormat)
+            normals = self._rawSection('vLight')
+            if normals is None:
+                normals = octEncodeArray(self.vLight[:vertexCount])
+            offset = self._packArrayInto(
+                buff, offset, TerrainTile.OctEncodedVertexNormals['xy'], normals)
+
+        watermask = self._getWatermaskData()
+        if watermask is not None:
             self.hasWatermask = True
             # Extension header ID is 2 for watermark
-            meta = TerrainTile.ExtensionHeader
-            f.write(packEntry(meta['extensionId'], 2))
-            # Extension header meta
-            nbRows = len(self.watermask)
-            if nbRows > 1:
-                # Unsigned char size len is 1
-                f.write(packEntry(meta['extensionLength'], TILEPXS))
-                if nbRows != 256:
-                    raise Exception(
-                        'Unexpected number of rows for the watermask: %s' % nbRows
-                    )
-                # From North to South
-                for i in range(0, nbRows):
-                    x = self.watermask[i]
-                    if len(x) != 256:
-                        raise Exception(
-                            'Unexpected number of columns for the watermask: %s' % len(
-                                x)
-                        )
-                    # From West to East
-                    for y in x:
-                        f.write(packEntry(TerrainTile.WaterMask['xy'], int(y)))
-            else:
-                f.write(packEntry(meta['extensionLength'], 1))
-                if self.watermask[0][0] is None:
-                    self.watermask[0][0] = 0
-                f.write(
-                    packEntry(TerrainTile.WaterMask['xy'], int(self.watermask[0][0])))
-
-    def fromTerrainTopology(self, topology, bounds=None):
+            pack_into(extensionHeaderFormat, buff, offset, 2, len(watermask))
+            offset += calcsize(extensionHeaderFormat)
+            offset = self._packArrayInto(
+                buff, offset, TerrainTile.WaterMask['xy'], watermask)
+        return offset
+
+    def fromTerrainTopology(self, topology, bounds=None, sortEdges=False,
+                            exactBoundingSphere=False):
         """
         A method to prepare a terrain tile data structure.
 
@@ -709,6 +1060,20 @@ class TerrainTile(object):
             If no bounds are provided, then the bounds
             are extracted from the topology object.
 
+        ``sortEdges``
+
+            Sort the vertices on the west and east edges from south to north and the
+            vertices on the south and north edges from west to east. If ``False``,
+            the vertices are listed in the order of their first use in the indices.
+            Default is ``False``.
+
+        ``exactBoundingSphere``
+
+            Compute the minimal bounding sphere of the vertices instead of the
+            smallest of Ritter's sphere and of the bounding box sphere. The sphere
+            is tighter, which helps the culling of the tile, but is more expensive
+            to compute. Default is ``False``.
+
         """
         if not isinstance(topology, TerrainTopology):
             raise Exception(
@@ -733,7 +1098,7 @@ class TerrainTile(object):
             self._north = topology.maxLat
 
         bSphere = BoundingSphere()
-        bSphere.fromPoints(topology.cartesianVertices)
+        bSphere.fromPoints(topology.cartesianVertices, exact=exactBoundingSphere)
 
         ecefMinX = topology.ecefMinX
         ecefMinY = topology.ecefMinY
@@ -778,26 +1143,38 @@ class TerrainTile(object):
                 self.header[k] = occlusionPCoords[2]
 
         # High watermark encoding performed during toFile
-        self.u = [self._quantizeLongitude(longitude) for longitude in topology.uVertex]
-        self.v = [self._quantizeLatitude(latitude) for latitude in topology.vVertex]
-        self.h = [self._quantizeHeight(height) for height in topology.hVertex]
-        self.indices = topology.indexData
+        self.u = self._quantizeLongitude(topology.uVertex)
+        self.v = self._quantizeLatitude(topology.vVertex)
+        self.h = self._quantizeHeight(topology.hVertex)
+        if self.compact:
+            self.u = self.u.astype('uint16')
+            self.v = self.v.astype('uint16')
+            self.h = self.h.astype('uint16')
+            self.indices = topology.indexData.astype(self._getIndexDtype())
+        else:
+            self.u = self.u.tolist()
+            self.v = self.v.tolist()
+            self.h = self.h.tolist()
+            self.indices = topology.indexData
 
         # List all the vertices on the edge of the tile
         # Use quantized values to determine if an indice belong to a tile edge
-        for indice in self.indices:
-            x = self.u[indice]
-            y = self.v[indice]
-
-            if x == self.MIN and indice not in self.westI:
-                self.westI.append(indice)
-            elif x == self.MAX and indice not in self.eastI:
-                self.eastI.append(indice)
-
-            if y == self.MIN and indice not in self.southI:
-                self.southI.append(indice)
-            elif y == self.MAX and indice not in self.northI:
-                self.northI.append(indice)
+        vertices, firstUse = np.unique(np.asarray(self.indices), return_index=True)
+        # In the order of their first use
+        vertices = vertices[np.argsort(firstUse, kind='stable')]
+        x = np.asarray(self.u)[vertices]
+        y = np.asarray(self.v)[vertices]
+        edges = []
+        for isOnEdge, alongEdge in ((x == self.MIN, y), (y == self.MIN, x),
+                                    (x == self.MAX, y), (y == self.MAX, x)):
+            edge = vertices[isOnEdge]
+            if sortEdges:
+                edge = edge[np.argsort(alongEdge[isOnEdge], kind='stable')]
+            if self.compact:
+                edges.append(edge.astype(self._getIndexDtype()))
+            else:
+                edges.append(edge.tolist())
+        self.westI, self.southI, self.eastI, self.northI = edges
 
         self.hasLighting = topology.hasLighting
         if self.hasLighting:
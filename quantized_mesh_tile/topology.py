@@ -7,13 +7,24 @@ Reference
 import math
 
 import numpy as np
+import shapely
 from shapely.geometry.base import BaseGeometry
 from shapely.geometry.polygon import Polygon
 from shapely.wkb import loads as load_wkb
 from shapely.wkt import loads as load_wkt
 
-from .llh_ecef import LLH2ECEF
-from .utils import collapseIntoTriangles, computeNormals
+from .llh_ecef import LLH2ECEFArray, LLH2ECEFGrid
+from .utils import (computeNormals, mortonCodes, triangulatePolygons,
+                    vertexCacheOrder)
+
+# Geometry types of a POLYGON Z in ISO WKB, in EWKB and in EWKB with a SRID
+WKB_POLYGON_Z = 1003
+EWKB_POLYGON_Z = 0x80000003
+EWKB_POLYGON_Z_SRID = 0xA0000003
+
+# Vertices with the same coordinates once rounded to this number of decimals
+# are merged when geometries are added
+LOOKUP_DECIMALS = 14
 
 
 class TerrainTopology(object):
@@ -46,6 +57,10 @@ class TerrainTopology(object):
 
         Default is `False`.
 
+    Geometries can be added in several batches with
+    :meth:`quantized_mesh_tile.topology.TerrainTopology.addGeometries`.
+    Vertices shared between batches are merged.
+
     Usage example::
 
         from quantized_mesh_tile.topology import TerrainTopology
@@ -79,8 +94,18 @@ class TerrainTopology(object):
         self.faces = []
         self.verticesLookup = {}
 
-        if self.geometries:
-            self.addGeometries(self.geometries)
+        # Growable buffers, only the first rows are used
+        self._vertexBuffer = np.empty((0, 3), dtype='float')
+        self._cartesianBuffer = np.empty((0, 3), dtype='float')
+        self._faceBuffer = np.empty((0, 3), dtype='int')
+        self._vertexCount = 0
+        self._cartesianCount = 0
+        self._faceCount = 0
+        # Number of vertices referenced in verticesLookup
+        self._lookupCount = 0
+
+        if geometries is not None and len(geometries) > 0:
+            self.addGeometries(geometries)
 
     def __repr__(self):
         msg = 'Min height:'
@@ -106,9 +131,236 @@ class TerrainTopology(object):
         msg += '\nNumber of triangles: %s' % (len(self.indexData) / 3)
         return msg
 
-    def addGeometries(self, geometries):
+    @classmethod
+    def fromArrays(cls, triangles, hasLighting=False, decimals=None):
+        """
+        A method to create a terrain tile topology from an array of triangles,
+        without any geometry parsing or per vertex lookup.
+
+        Arguments:
+
+        ``triangles``
+
+            An array of shape (T, 3, 3) (or anything which can be converted to it)
+            containing the 3 vertices (lon, lat, height) of each triangle. (Required)
+
+        ``hasLighting``
+
+            Indicate whether unit vectors should be computed for the lighting
+            extension. Default is `False`.
+
+        ``decimals``
+
+            The number of decimals used to determine if two vertices are identical.
+            If `None`, only vertices with exactly the same coordinates are merged.
+            Default is `None`.
+        """
+        topology = cls(hasLighting=hasLighting)
+        topology._addTriangles(triangles, decimals=decimals, useLookup=False)
+        topology._create()
+        return topology
+
+    @classmethod
+    def fromHeightGrid(cls, heights, bounds, hasLighting=False):
+        """
+        A method to create a terrain tile topology from a regular grid of heights,
+        without building any triangle. Each cell of the grid is split into
+        2 triangles.
+
+        Arguments:
+
+        ``heights``
+
+            A 2D array of shape (R, C) containing the heights of the grid,
+            defined from north-to-south and west-to-east. The first and last
+            rows and columns lie on the bounds. R and C must be at least 2.
+            (Required)
+
+        ``bounds``
+
+            The bounds of the grid. (west, south, east, north) (Required)
+
+        ``hasLighting``
+
+            Indicate whether unit vectors should be computed for the lighting
+            extension. Default is `False`.
+        """
+        heights = np.asarray(heights, dtype='float64')
+        if heights.ndim != 2 or min(heights.shape) < 2:
+            raise ValueError(
+                'Heights must be an array of shape (R, C) with R, C >= 2, got %s' % (
+                    heights.shape,))
+        west, south, east, north = bounds
+        rows, cols = heights.shape
+        lons = np.linspace(west, east, cols)
+        lats = np.linspace(north, south, rows)
+
+        # Grid indices of the corners of each cell, rows going southward
+        nw = (np.arange(rows - 1)[:, np.newaxis] * cols +
+              np.arange(cols - 1)).ravel()
+        ne = nw + 1
+        sw = nw + cols
+        se = sw + 1
+        faces = np.empty((len(nw), 2, 3), dtype='int')
+        faces[:, 0] = np.column_stack((sw, se, ne))
+        faces[:, 1] = np.column_stack((sw, ne, nw))
+        faces = faces.reshape(-1, 3)
+
+        cartesianVertices = LLH2ECEFGrid(lons, lats, heights)
+        return cls._fromGridFaces(lons, lats, heights, faces, cartesianVertices,
+                                  hasLighting=hasLighting)
+
+    @classmethod
+    def _fromGridFaces(cls, lons, lats, heights, faces, cartesianVertices,
+                       hasLighting=False):
+        """
+        A private method to create a terrain tile topology from counter clockwise
+        faces referencing the vertices of a grid by their index (row * C + column).
+        ``cartesianVertices`` is the array of shape (R, C, 3) of the grid
+        vertices in ECEF. The vertices which are not used by any face are dropped.
+        """
+        rows, cols = heights.shape
+        # Number the vertices in the order of their first use
+        used, firstUse = np.unique(faces.ravel(), return_index=True)
+        order = used[np.argsort(firstUse, kind='stable')]
+        rank = np.empty(rows * cols, dtype='int')
+        rank[order] = np.arange(len(order))
+
+        vertices = np.empty((rows, cols, 3), dtype='float64')
+        vertices[:, :, 0] = lons
+        vertices[:, :, 1] = lats[:, np.newaxis]
+        vertices[:, :, 2] = heights
+
+        topology = cls(hasLighting=hasLighting)
+        topology._appendVertices(vertices.reshape(-1, 3)[order])
+        topology._appendFaces(rank[faces])
+        topology._cartesianBuffer = cartesianVertices.reshape(-1, 3)[order]
+        topology._cartesianCount = topology._vertexCount
+        topology._create()
+        return topology
+
+    @classmethod
+    def fromGeometries(cls, geometries, hasLighting=False, decimals=None):
+        """
+        A method to create a terrain tile topology from a list or an array of
+        shapely polygons, WKT or WKB Polygons representing 3 dimensional triangles.
+        All the geometries are parsed at once.
+        See :meth:`quantized_mesh_tile.topology.TerrainTopology.fromArrays` for
+        the other arguments.
+        """
+        triangles = cls._geometriesToTriangles(geometries)
+        return cls.fromArrays(triangles, hasLighting=hasLighting, decimals=decimals)
+
+    @staticmethod
+    def _geometriesToRings(geometries):
+        """
+        A private method to convert shapely polygons, (E)WKB or (E)WKT Polygons
+        into the coordinates of their exterior rings (closing vertex included).
+        Returns an array of shape (N, 3) and the offsets of the R rings in
+        this array, of shape (R + 1,).
+        """
+        specs = np.empty(len(geometries), dtype=object)
+        specs[:] = list(geometries)
+        isWkt = np.array([
+            type(spec) is str and spec.startswith('POLYGON Z') for spec in specs
+        ], dtype=bool)
+        isWkb = np.array([
+            isinstance(spec, (str, bytes)) for spec in specs
+        ], dtype=bool) & ~isWkt
+        try:
+            specs[isWkt] = shapely.from_wkt(specs[isWkt])
+            specs[isWkb] = shapely.from_wkb(specs[isWkb])
+        except Exception:
+            raise ValueError('Failed to convert WKT or WKB to a Shapely geometry')
+
+        if not all(isinstance(geometry, BaseGeometry) for geometry in specs):
+            raise ValueError('Only shapely geometries, WKT or WKB are accepted.')
+        if not np.all(shapely.get_type_id(specs) == shapely.GeometryType.POLYGON):
+            raise ValueError('Only polygons are accepted.')
+        if not np.all(shapely.has_z(specs)):
+            raise ValueError('Missing z dimension.')
+
+        rings = shapely.get_exterior_ring(specs)
+        offsets = np.zeros(len(rings) + 1, dtype='int')
+        np.cumsum(shapely.get_num_coordinates(rings), out=offsets[1:])
+        coordinates = shapely.get_coordinates(rings, include_z=True)
+        return coordinates, offsets
+
+    @classmethod
+    def _geometriesToTriangles(cls, geometries):
+        """
+        A private method to convert shapely polygons, (E)WKB or (E)WKT Polygons
+        representing triangles into an array of shape (T, 3, 3).
+        """
+        triangles = cls._readWkbTriangles(geometries)
+        if triangles is not None:
+            return triangles
+        coordinates, offsets = cls._geometriesToRings(geometries)
+        if not np.all(np.diff(offsets) == 4):
+            raise ValueError('None triangular shape has beeen found.')
+        return coordinates.reshape(-1, 4, 3)[:, :3]
+
+    @staticmethod
+    def _readWkbTriangles(geometries):
+        """
+        A private method to read (E)WKB triangles without creating any Shapely
+        geometry. It only applies if all the geometries are POLYGON Z with a
+        single ring of 4 points, using the same byte order and either all
+        with or all without a SRID. Returns an array of shape (T, 3, 3),
+        or None if the geometries do not match this layout.
+        """
+        if len(geometries) == 0 or not all(
+                type(geometry) is bytes for geometry in geometries):
+            return None
+        size = len(geometries[0])
+        if size not in (109, 113) or not all(
+                len(geometry) == size for geometry in geometries):
+            return None
+        data = b''.join(geometries)
+        byteOrder = data[0]
+        if byteOrder not in (0, 1):
+            return None
+        e = '<' if byteOrder == 1 else '>'
+        fields = [('byteOrder', 'u1'), ('type', e + 'u4')]
+        if size == 113:
+            fields.append(('srid', e + 'u4'))
+            types = (EWKB_POLYGON_Z_SRID,)
+        else:
+            types = (WKB_POLYGON_Z, EWKB_POLYGON_Z)
+        fields += [('rings', e + 'u4'), ('points', e + 'u4'),
+                   ('coordinates', e + 'f8', (4, 3))]
+        records = np.frombuffer(data, dtype=np.dtype(fields))
+        if not (np.all(records['byteOrder'] == byteOrder) and
+                np.all(np.isin(records['type'], types)) and
+                np.all(records['rings'] == 1) and
+                np.all(records['points'] == 4)):
+            return None
+        return records['coordinates'][:, :3].astype('float64')
+
+    @staticmethod
+    def _deduplicateVertices(vertices, decimals=None):
+        """
+        A private method to merge identical vertices. Returns the unique vertices
+        in the order of their first occurrence and, for each input vertex,
+        the index of its unique vertex.
+        """
+        if len(vertices) == 0:
+            return np.zeros((0, 3), dtype='float64'), np.zeros(0, dtype='int')
+        keys = vertices if decimals is None else np.round(vertices, decimals)
+        # Adding 0.0 turns -0.0 into 0.0, so that both share the same key
+        unique, firstIndex, inverse = np.unique(
+            keys + 0.0, axis=0, return_index=True, return_inverse=True)
+        # Number the vertices in the order of their first occurrence
+        order = np.argsort(firstIndex, kind='stable')
+        rank = np.empty(len(order), dtype='int')
+        rank[order] = np.arange(len(order))
+        return vertices[firstIndex[order]], rank[inverse.reshape(-1)]
+
+    def addGeometries(self, geometries, finalize=True):
         """
         Method to add geometries to the terrain tile topology.
+        It can be called several times, the vertices of the new geometries
+        are merged with the vertices already in the topology.
 
         Arguments:
 
@@ -120,27 +372,164 @@ class TerrainTopology(object):
             or
             A list of triplet of vertices using the following structure:
             ``(((lon0/lat0/height0),(...),(lon2,lat2,height2)),(...))``
+            or
+            A numpy array of shape (T, 3, 3) containing the vertices of T triangles.
+
+        ``finalize``
+
+            When set to `False`, the geometries are only appended and the
+            topology must be finalized with
+            :meth:`quantized_mesh_tile.topology.TerrainTopology.finalize`
+            once all the geometries have been added. This avoids recomputing
+            the final arrays after each batch.
+
+            Default is `True`.
         """
-        if isinstance(geometries, (list, tuple)) and geometries:
-            for geometry in geometries:
-                if isinstance(geometry, (str, bytes)):
-                    geometry = self._loadGeometry(geometry)
-                    vertices = self._extractVertices(geometry)
-                elif isinstance(geometry, BaseGeometry):
-                    vertices = self._extractVertices(geometry)
-                else:
-                    vertices = geometry
-
-                if self.autocorrectGeometries:
-                    if len(vertices) > 3:
-                        triangles = collapseIntoTriangles(vertices)
-                        for triangle in triangles:
-                            self._addVertices(triangle)
-                    else:
-                        self._addVertices(vertices)
+        if isinstance(geometries, np.ndarray) and geometries.dtype != object:
+            self._addTriangles(geometries)
+        elif isinstance(geometries, (list, tuple, np.ndarray)) and len(geometries):
+            if all(isinstance(geometry, (str, bytes, BaseGeometry))
+                   for geometry in geometries):
+                geometries = self._parseGeometries(geometries)
+            else:
+                triangles = self._sequencesToTriangles(geometries)
+                if triangles is not None:
+                    geometries = triangles
+            if isinstance(geometries, np.ndarray):
+                self._addTriangles(geometries)
+            else:
+                self._addGeometriesVertices(geometries)
+        if finalize:
+            self._create()
+
+    def finalize(self):
+        """
+        Method to compute the final arrays of the terrain tile topology after
+        geometries have been added with ``finalize=False``.
+        """
+        self._create()
+
+    def reorder(self, vertexCache=True, morton=False):
+        """
+        Method to reorder the faces and the vertices of the terrain tile topology
+        for a smaller encoded tile and a faster rendering. The mesh itself is
+        unchanged.
+
+        The vertices are always renumbered in the order of their first use in the
+        faces, so that the high water mark encoded indices are mostly 0.
+        Vertices which are not used by any face are dropped.
+
+        Arguments:
+
+        ``vertexCache``
+
+            Reorder the faces with Forsyth's algorithm, so that the vertices of
+            consecutive faces are still in the post-transform vertex cache of
+            the GPU. See :func:`quantized_mesh_tile.utils.vertexCacheOrder`.
+
+            Default is `True`.
+
+        ``morton``
+
+            Sort the faces along a Morton (Z-order) curve of their centroids first,
+            so that consecutive vertices are close to each other and the deltas of
+            their encoded coordinates are small. When combined with ``vertexCache``,
+            the Morton order is used whenever the vertex cache has no candidate.
+
+            Default is `False`.
+        """
+        # Geometries may have been added without finalizing the topology
+        self._create()
+        faces = self._faceBuffer[:self._faceCount]
+        if morton and len(faces):
+            vertices = self._vertexBuffer[:self._vertexCount]
+            centroids = vertices[faces, :2].mean(axis=1)
+            minimum = vertices[:, :2].min(axis=0)
+            extent = vertices[:, :2].max(axis=0) - minimum
+            extent[extent == 0] = 1.0
+            quantized = np.round((centroids - minimum) / extent * 65535)
+            codes = mortonCodes(quantized[:, 0], quantized[:, 1])
+            faces = faces[np.argsort(codes, kind='stable')]
+        if vertexCache:
+            faces = faces[vertexCacheOrder(faces)]
+
+        # Number the vertices in the order of their first use
+        used, firstUse = np.unique(faces.ravel(), return_index=True)
+        order = used[np.argsort(firstUse, kind='stable')]
+        rank = np.empty(self._vertexCount, dtype='int')
+        rank[order] = np.arange(len(order))
+
+        self._vertexBuffer = self._vertexBuffer[order]
+        self._cartesianBuffer = self._cartesianBuffer[order]
+        self._faceBuffer = rank[faces]
+        self._vertexCount = self._cartesianCount = len(order)
+        self.vertices = self._vertexBuffer
+        self.cartesianVertices = self._cartesianBuffer
+        self.faces = self._faceBuffer
+        if self.hasLighting:
+            self.verticesUnitVectors = self.verticesUnitVectors[order]
+        # The lookup is rebuilt when geometries are added
+        self.verticesLookup = {}
+        self._lookupCount = 0
+
+    def _addGeometriesVertices(self, geometries):
+        """
+        A private method to add geometries one by one.
+        """
+        for geometry in geometries:
+            if isinstance(geometry, (str, bytes)):
+                geometry = self._loadGeometry(geometry)
+                vertices = self._extractVertices(geometry)
+            elif isinstance(geometry, BaseGeometry):
+                vertices = self._extractVertices(geometry)
+            else:
+                vertices = geometry
+
+            if self.autocorrectGeometries:
+                if len(vertices) > 3:
+                    triangles, _ = triangulatePolygons(
+                        vertices, [0, len(vertices)])
+                    for triangle in triangles.tolist():
+                        self._addVertices(triangle)
                 else:
                     self._addVertices(vertices)
-            self._create()
+            else:
+                self._addVertices(vertices)
+
+    @staticmethod
+    def _sequencesToTriangles(geometries):
+        """
+        A private method returning a list of triplets of vertices as an array
+        of shape (T, 3, 3), or None if the geometries are not all triangles.
+        """
+        try:
+            triangles = np.asarray(geometries, dtype='float64')
+        except (ValueError, TypeError):
+            return None
+        if triangles.ndim != 3 or triangles.shape[1:] != (3, 3):
+            return None
+        return triangles
+
+    def _parseGeometries(self, geometries):
+        """
+        A private method to parse a list of shapely polygons, WKT or WKB Polygons
+        at once. Returns an array of triangles of shape (T, 3, 3). When
+        autocorrecting, polygons which are not triangles are triangulated.
+        """
+        triangles = self._readWkbTriangles(geometries)
+        if triangles is not None:
+            return triangles
+        coordinates, offsets = self._geometriesToRings(geometries)
+        if np.all(np.diff(offsets) == 4):
+            return coordinates.reshape(-1, 4, 3)[:, :3]
+        if not self.autocorrectGeometries:
+            raise ValueError('None triangular shape has beeen found.')
+        # Drop the closing vertex of the rings
+        isClosing = np.zeros(len(coordinates), dtype=bool)
+        isClosing[offsets[1:] - 1] = True
+        triangles, _ = triangulatePolygons(
+            coordinates[~isClosing], offsets - np.arange(len(offsets)))
+        return triangles
 
     def _extractVertices(self, geometry):
         """
@@ -178,18 +567,64 @@ class TerrainTopology(object):
 
         return geometry
 
+    def _addTriangles(self, triangles, decimals=None, useLookup=True):
+        """
+        A private method to add an array of triangles of shape (T, 3, 3) to the
+        terrain tile topology. The vertices are first merged within the batch.
+        If ``useLookup`` is `True`, they are then merged with the vertices
+        already in the topology, see ``_lookupVertices``.
+        """
+        triangles = np.asarray(triangles, dtype='float64')
+        if triangles.ndim != 3 or triangles.shape[1:] != (3, 3):
+            raise ValueError(
+                'Triangles must be an array of shape (T, 3, 3), got %s' % (
+                    triangles.shape,))
+        triangles = self._assureCounterClockWiseTriangles(triangles)
+        vertices, faces = self._deduplicateVertices(
+            triangles.reshape(-1, 3), decimals)
+
+        if useLookup:
+            indices, isNew = self._lookupVertices(vertices)
+            vertices = vertices[isNew]
+        else:
+            indices = np.arange(self._vertexCount,
+                                self._vertexCount + len(vertices))
+
+        self._appendVertices(vertices)
+        self._appendFaces(indices[faces].reshape(-1, 3))
+
+    def _lookupVertices(self, vertices):
+        """
+        A private method to look up unique vertices in ``verticesLookup``, which
+        persists across batches. Returns the index of each vertex in the topology,
+        the new vertices being numbered after the existing ones in their order,
+        and a mask of the new vertices. The new vertices are referenced in
+        ``verticesLookup``, they must then be appended to the topology.
+        """
+        self._indexVertices()
+        lookup = self.verticesLookup
+        count = self._vertexCount
+        indices = np.empty(len(vertices), dtype='int')
+        isNew = np.zeros(len(vertices), dtype=bool)
+        for i, key in enumerate(self._lookupKeys(vertices)):
+            index = lookup.get(key)
+            if index is None:
+                index = lookup[key] = count
+                count += 1
+                isNew[i] = True
+            indices[i] = index
+        self._lookupCount = count
+        return indices, isNew
+
     def _addVertices(self, vertices):
         """
         A private method to add vertices to the terrain tile topology.
         """
+        self._indexVertices()
         vertices = self._assureCounterClockWise(vertices)
         face = []
         for vertex in vertices:
-            lookupKey = ','.join(
-                ["{:.14f}".format(vertex[0]),
-                 "{:.14f}".format(vertex[1]),
-                 "{:.14f}".format(vertex[2])]
-            )
+            lookupKey = self._lookupKey(vertex)
             faceIndex = self._lookupVertexIndex(lookupKey)
             if faceIndex is not None:
                 # Sometimes we can have triangles with zero area
@@ -199,26 +634,94 @@ class TerrainTopology(object):
                 #    break
                 face.append(faceIndex)
             else:
-                self.vertices.append(vertex)
-                self.cartesianVertices.append(
-                    LLH2ECEF(vertex[0], vertex[1], vertex[2]))
-                faceIndex = len(self.vertices) - 1
+                faceIndex = self._vertexCount
+                self._appendVertices([vertex])
+                self._lookupCount = self._vertexCount
                 self.verticesLookup[lookupKey] = faceIndex
                 face.append(faceIndex)
         # if len(face) == 3:
-        self.faces.append(face)
+        self._appendFaces([face])
+
+    @staticmethod
+    def _grow(buffer, size):
+        """
+        A private method returning a buffer with room for at least ``size`` rows
+        and starting with the rows of ``buffer``. The capacity is doubled,
+        so that appending is done in amortized constant time.
+        """
+        if size <= len(buffer):
+            return buffer
+        capacity = max(size, 2 * len(buffer), 64)
+        grown = np.empty((capacity,) + buffer.shape[1:], dtype=buffer.dtype)
+        grown[:len(buffer)] = buffer
+        return grown
+
+    def _appendVertices(self, vertices):
+        """
+        A private method to append (lon, lat, height) vertices to the vertex buffer.
+        """
+        start = self._vertexCount
+        self._vertexCount += len(vertices)
+        self._vertexBuffer = self._grow(self._vertexBuffer, self._vertexCount)
+        self._vertexBuffer[start:self._vertexCount] = vertices
+
+    def _appendFaces(self, faces):
+        """
+        A private method to append faces to the face buffer.
+        """
+        start = self._faceCount
+        self._faceCount += len(faces)
+        self._faceBuffer = self._grow(self._faceBuffer, self._faceCount)
+        self._faceBuffer[start:self._faceCount] = faces
+
+    @staticmethod
+    def _lookupKeys(vertices):
+        """
+        A private method returning the keys of an array of vertices in
+        ``verticesLookup``, the tuples of their coordinates rounded to
+        ``LOOKUP_DECIMALS`` decimals.
+        """
+        # Adding 0.0 turns -0.0 into 0.0, so that both share the same key
+        rounded = np.round(np.asarray(vertices, dtype='float64'), LOOKUP_DECIMALS)
+        return list(map(tuple, (rounded + 0.0).tolist()))
+
+    @classmethod
+    def _lookupKey(cls, vertex):
+        """
+        A private method returning the key of a vertex in ``verticesLookup``.
+        """
+        return cls._lookupKeys([vertex[:3]])[0]
+
+    def _indexVertices(self):
+        """
+        A private method to reference the vertices which were added without
+        lookup (see ``fromArrays``) in ``verticesLookup``.
+        """
+        if self._lookupCount < self._vertexCount:
+            vertices = self._vertexBuffer[self._lookupCount:self._vertexCount]
+            setdefault = self.verticesLookup.setdefault
+            for i, key in enumerate(self._lookupKeys(vertices), self._lookupCount):
+                setdefault(key, i)
+            self._lookupCount = self._vertexCount
 
     def _create(self):
         """
         A private method to create the final terrain data structure.
-        """
-        self.vertices = np.array(self.vertices, dtype='float')
-        self.cartesianVertices = np.array(self.cartesianVertices, dtype='float')
-        self.faces = np.array(self.faces, dtype='int')
+        Only the cartesian coordinates of the new vertices are computed.
+        """
+        start = self._cartesianCount
+        self._cartesianCount = self._vertexCount
+        self._cartesianBuffer = self._grow(
+            self._cartesianBuffer, self._cartesianCount)
+        LLH2ECEFArray(self._vertexBuffer[start:self._cartesianCount],
+                      out=self._cartesianBuffer[start:self._cartesianCount])
+
+        self.vertices = self._vertexBuffer[:self._vertexCount]
+        self.cartesianVertices = self._cartesianBuffer[:self._cartesianCount]
+        self.faces = self._faceBuffer[:self._faceCount]
         if self.hasLighting:
             self.verticesUnitVectors = computeNormals(
                 self.cartesianVertices, self.faces)
-        self.verticesLookup = {}
 
     def _lookupVertexIndex(self, lookupKey):
         """
@@ -228,13 +731,40 @@ class TerrainTopology(object):
         if lookupKey in self.verticesLookup:
             return self.verticesLookup[lookupKey]
 
+    @staticmethod
+    def _assureCounterClockWiseTriangles(triangles):
+        """
+        Private method to make sure the vertices of an array of triangles of shape
+        (T, 3, 3) unwind in counterwise order. The second and third vertices of
+        the triangles with a negative (clockwise) 2D cross product are swapped.
+        Returns a new array.
+        """
+        triangles = np.array(triangles, dtype='float64')
+        a = triangles[:, 0, :2]
+        b = triangles[:, 1, :2]
+        c = triangles[:, 2, :2]
+        cross = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - \
+            (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        clockWise = cross < 0
+        triangles[clockWise, 1:] = triangles[clockWise, :0:-1]
+        return triangles
+
     def _assureCounterClockWise(self, vertices):
         """
         Private method to make sure vertices unwind in counterwise order.
+        For triangles, the second and third vertices are swapped if the 2D cross
+        product is negative. Other polygons are sorted around their centroid.
         Inspired by:
         http://stackoverflow.com/questions/1709283/\
         how-can-i-sort-a-coordinate-list-for-a-rectangle-counterclockwise
         """
+        if len(vertices) == 3:
+            a, b, c = vertices
+            cross = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+            if cross < 0:
+                return [a, c, b]
+            return [a, b, c]
+
         mlat = sum(coord[0] for coord in vertices) / float(len(vertices))
         mlon = sum(coord[1] for coord in vertices) / float(len(vertices))
 
@@ -10,6 +10,7 @@ import numpy as np
 from . import cartesian3d as c3d
 
 EPSILON6 = 0.000001
+GZIP_MAGIC = b'\x1f\x8b'
 
 
 def packEntry(type, value):
@@ -21,29 +22,33 @@ def unpackEntry(f, entry):
 
 
 def packIndices(f, type, indices):
-    for i in indices:
-        f.write(packEntry(type, i))
+    f.write(np.asarray(indices, dtype='<%s' % type).tobytes())
 
 
 def decodeIndices(indices):
-    out = []
-    highest = 0
-    for i in indices:
-        out.append(highest - i)
-        if i == 0:
-            highest += 1
-    return out
+    """
+    Reverses the high-water mark encoding of an array of indices.
+    The current highest index is the number of zero codes seen so far.
+    """
+    codes = np.asarray(indices, dtype='int64')
+    isNew = codes == 0
+    highest = np.cumsum(isNew) - isNew
+    return (highest - codes).astype('uint32')
 
 
 def encodeIndices(indices):
-    out = []
-    highest = 0
-    for i in indices:
-        code = highest - i
-        out.append(code)
-        if code == 0:
-            highest += 1
-    return out
+    """
+    High-water mark encoding of an array of indices.
+    The current highest index is the running maximum of the previous indices plus one.
+    """
+    indices = np.asarray(indices, dtype='int64')
+    highest = np.zeros(len(indices), dtype='int64')
+    if len(indices) > 1:
+        np.maximum.accumulate(indices[:-1] + 1, out=highest[1:])
+    codes = highest - indices
+    if np.any(codes < 0):
+        raise ValueError('Indices must be ordered by first use (high-water mark)')
+    return codes
 
 
 def zigZagEncode(n):
@@ -59,7 +64,7 @@ def zigZagEncode(n):
 
 
 def zigZagDecode(z):
-    """ Reverses ZigZag encoding """
+    """ Reverses ZigZag encoding (also works element-wise on integer arrays) """
     return (z >> 1) ^ (-(z & 1))
 
 
@@ -116,6 +121,53 @@ def octDecode(x, y):
     return c3d.normalize(res)
 
 
+# Vectorized version of octEncode
+# Compress an array of normalized vectors of shape (N, 3) into an array of
+# 2 snorm values of shape (N, 2)
+def octEncodeArray(vectors):
+    vectors = np.asarray(vectors, dtype='float64').reshape(-1, 3)
+    x, y, z = vectors[:, 0], vectors[:, 1], vectors[:, 2]
+    if np.any(np.abs(x * x + y * y + z * z - 1.0) > EPSILON6):
+        raise ValueError('Only normalized vectors are supported')
+    l1Norm = np.abs(x) + np.abs(y) + np.abs(z)
+    resX = x / l1Norm
+    resY = y / l1Norm
+
+    negative = z < 0.0
+    foldedX = (1.0 - np.abs(resY)) * np.where(resX < 0.0, -1.0, 1.0)
+    foldedY = (1.0 - np.abs(resX)) * np.where(resY < 0.0, -1.0, 1.0)
+    resX = np.where(negative, foldedX, resX)
+    resY = np.where(negative, foldedY, resY)
+
+    res = np.empty((len(vectors), 2), dtype='uint8')
+    res[:, 0] = np.round((np.clip(resX, -1.0, 1.0) * 0.5 + 0.5) * 255.0)
+    res[:, 1] = np.round((np.clip(resY, -1.0, 1.0) * 0.5 + 0.5) * 255.0)
+    return res
+
+
+# Vectorized version of octDecode
+# Decompress an array of 2 snorm values of shape (N, 2) into an array of
+# normalized vectors of shape (N, 3)
+def octDecodeArray(xy):
+    xy = np.asarray(xy).reshape(-1, 2)
+    if np.any((xy < 0) | (xy > 255)):
+        raise ValueError('x and y must be signed and normalized between 0 and 255')
+    xy = xy.astype('float64') / 255.0 * 2.0 - 1.0
+    x, y = xy[:, 0], xy[:, 1]
+    z = 1.0 - (np.abs(x) + np.abs(y))
+
+    negative = z < 0.0
+    foldedX = (1.0 - np.abs(y)) * np.where(x < 0.0, -1.0, 1.0)
+    foldedY = (1.0 - np.abs(x)) * np.where(y < 0.0, -1.0, 1.0)
+    res = np.empty((len(xy), 3), dtype='float64')
+    res[:, 0] = np.where(negative, foldedX, x)
+    res[:, 1] = np.where(negative, foldedY, y)
+    res[:, 2] = z
+    x, y, z = res[:, 0], res[:, 1], res[:, 2]
+    res /= np.sqrt(x * x + y * y + z * z)[:, np.newaxis]
+    return res
+
+
 def centroid(a, b, c):
     return [sum((a[0], b[0], c[0])) / 3,
             sum((a[1], b[1], c[1])) / 3,
@@ -135,34 +187,36 @@ def triangleArea(a, b):
 # https://github.com/AnalyticalGraphicsInc/cesium/blob/master/
 #     Source/Core/GeometryPipeline.js#L1071
 def computeNormals(vertices, faces):
-    numVertices = len(vertices)
-    numFaces = len(faces)
-    normalsPerFace = [None] * numFaces
-    areasPerFace = [0.0] * numFaces
-    normalsPerVertex = np.zeros(vertices.shape, dtype=vertices.dtype)
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces, dtype='int').reshape(-1, 3)
+    v0 = vertices[faces[:, 0]]
+    v1 = vertices[faces[:, 1]]
+    v2 = vertices[faces[:, 2]]
 
-    for i in range(0, numFaces):
-        face = faces[i]
-        v0 = vertices[face[0]]
-        v1 = vertices[face[1]]
-        v2 = vertices[face[2]]
+    normalsPerFace = np.cross(v1 - v0, v2 - v0)
+    # Same weighting as triangleArea(v0, v1)
+    areasPerFace = 0.5 * np.sqrt(np.sum(np.cross(v0, v1) ** 2, axis=1))
 
-        normal = np.cross(c3d.subtract(v1, v0), c3d.subtract(v2, v0))
-
-        area = triangleArea(v0, v1)
-        areasPerFace[i] = area
-        normalsPerFace[i] = normal
+    # Accumulate the weighted normals of the faces sharing a vertex
+    normalsPerVertex = np.zeros(vertices.shape, dtype=vertices.dtype)
+    weightedNormals = normalsPerFace * areasPerFace[:, np.newaxis]
+    np.add.at(normalsPerVertex, faces.ravel(), np.repeat(weightedNormals, 3, axis=0))
 
-    for i in range(0, numFaces):
-        face = faces[i]
-        weightedNormal = [c * areasPerFace[i] for c in normalsPerFace[i]]
-        for j in face:
-            normalsPerVertex[j] = c3d.add(normalsPerVertex[j], weightedNormal)
+    x, y, z = normalsPerVertex[:, 0], normalsPerVertex[:, 1], normalsPerVertex[:, 2]
+    magnitudes = np.sqrt(x * x + y * y + z * z)[:, np.newaxis]
+    np.divide(normalsPerVertex, magnitudes, out=normalsPerVertex, where=magnitudes > 0)
+    return normalsPerVertex
 
-    for i in range(0, numVertices):
-        normalsPerVertex[i] = c3d.normalize(normalsPerVertex[i])
 
-    return normalsPerVertex
+def isGzipped(f):
+    """
+    Checks the gzip magic number at the current position of a seekable file-like
+    object without moving it.
+    """
+    position = f.tell()
+    magic = f.read(len(GZIP_MAGIC))
+    f.seek(position)
+    return magic == GZIP_MAGIC
 
 
 def gzipFileObject(data):
@@ -216,3 +270,224 @@ def collapseIntoTriangles(coords):
         coords.pop(convergingPoint)
     triangles.append(coords)
     return triangles
+
+
+# Ear clipping triangulation of a batch of polygons
+# coordinates is an array of shape (N, 3) containing the vertices of the rings
+# (without closing vertex) and offsets an array of shape (R + 1,) containing
+# the offsets of the R rings in coordinates.
+# Returns an array of triangles of shape (T, 3, 3), the triangles of a ring
+# following the triangles of the previous ring, and the number of triangles
+# per ring. Triangles and quadrilaterals are handled without clipping.
+def triangulatePolygons(coordinates, offsets):
+    coordinates = np.asarray(coordinates, dtype='float64').reshape(-1, 3)
+    offsets = np.asarray(offsets, dtype='int')
+    sizes = np.diff(offsets)
+    if np.any(sizes < 3):
+        raise ValueError('A polygon must have at least 3 vertices')
+    ringIds = np.arange(len(sizes))
+
+    # Signed area (shoelace) of each ring, positive if counter clockwise
+    x = coordinates[:, 0]
+    y = coordinates[:, 1]
+    following = np.arange(len(coordinates)) + 1
+    following[offsets[1:] - 1] = offsets[:-1]
+    areas = np.add.reduceat(x * y[following] - x[following] * y, offsets[:-1]) \
+        if len(sizes) else np.zeros(0)
+    orientations = np.where(areas < 0, -1.0, 1.0)
+
+    indices = []
+    triangleRings = []
+
+    isTriangle = sizes == 3
+    start = offsets[:-1][isTriangle]
+    indices.append(start[:, np.newaxis] + np.arange(3))
+    triangleRings.append(ringIds[isTriangle])
+
+    # Quadrilaterals are split along the diagonal leaving both halves with
+    # the orientation of the ring
+    isQuad = sizes == 4
+    start = offsets[:-1][isQuad]
+    a, b, c, d = [start + i for i in range(4)]
+    sign = orientations[isQuad]
+    useAC = (_cross2D(x, y, a, b, c) * sign > 0) & (_cross2D(x, y, c, d, a) * sign > 0)
+    quads = np.where(
+        useAC[:, np.newaxis, np.newaxis],
+        np.stack([np.stack([a, b, c], 1), np.stack([c, d, a], 1)], 1),
+        np.stack([np.stack([b, c, d], 1), np.stack([d, a, b], 1)], 1))
+    indices.append(quads.reshape(-1, 3))
+    triangleRings.append(np.repeat(ringIds[isQuad], 2))
+
+    xy = np.column_stack((x, y)).tolist()
+    for ringId in ringIds[sizes > 4]:
+        start = offsets[ringId]
+        ring = xy[start:offsets[ringId + 1]]
+        triangles = _earClip(ring, orientations[ringId])
+        indices.append(np.array(triangles, dtype='int').reshape(-1, 3) + start)
+        triangleRings.append(np.full(len(triangles), ringId))
+
+    indices = np.concatenate(indices)
+    triangleRings = np.concatenate(triangleRings)
+    order = np.argsort(triangleRings, kind='stable')
+    return coordinates[indices[order]], sizes - 2
+
+
+def _cross2D(x, y, a, b, c):
+    return (x[b] - x[a]) * (y[c] - y[a]) - (y[b] - y[a]) * (x[c] - x[a])
+
+
+# Clips the ears of a single ring of (x, y) coordinates, orientation being 1
+# for a counter clockwise ring and -1 for a clockwise ring.
+# Returns the triangles as triplets of indices in the ring.
+# Only the reflex (or flat) vertices within the bounding box of an ear can be
+# inside it, and the search for the next ear goes on from the last clipped
+# ear, so that a ring of n vertices with r reflex vertices is clipped in about
+# O(n * r) instead of O(n^3).
+def _earClip(ring, orientation):
+    def cross(a, b, c):
+        return orientation * ((ring[b][0] - ring[a][0]) * (ring[c][1] - ring[a][1]) -
+                              (ring[b][1] - ring[a][1]) * (ring[c][0] - ring[a][0]))
+
+    def isEar(p, i, n):
+        if cross(p, i, n) <= 0:
+            return False
+        (xp, yp), (xi, yi), (xn, yn) = ring[p], ring[i], ring[n]
+        minX, maxX = min(xp, xi, xn), max(xp, xi, xn)
+        minY, maxY = min(yp, yi, yn), max(yp, yi, yn)
+        for j in reflex:
+            x, y = ring[j]
+            if x < minX or x > maxX or y < minY or y > maxY or \
+                    ring[j] in (ring[p], ring[i], ring[n]):
+                continue
+            # The ear must not contain any other vertex of the ring
+            if cross(p, i, j) >= 0 and cross(i, n, j) >= 0 and \
+                    cross(n, p, j) >= 0:
+                return False
+        return True
+
+    count = len(ring)
+    previous = [count - 1] + list(range(count - 1))
+    following = list(range(1, count)) + [0]
+    reflex = set(i for i in range(count)
+                 if cross(previous[i], i, following[i]) <= 0)
+    triangles = []
+    i = 0
+    # Number of vertices tested since the last clipped ear
+    tested = 0
+    while count > 3:
+        p, n = previous[i], following[i]
+        if tested >= count:
+            # Degenerate or self intersecting ring, clip the most convex vertex
+            candidates = [i]
+            while following[candidates[-1]] != i:
+                candidates.append(following[candidates[-1]])
+            i = max(candidates, key=lambda k: cross(previous[k], k, following[k]))
+            p, n = previous[i], following[i]
+        elif not isEar(p, i, n):
+            i = n
+            tested += 1
+            continue
+        triangles.append((p, i, n))
+        following[p] = n
+        previous[n] = p
+        reflex.discard(i)
+        count -= 1
+        for k in (p, n):
+            if cross(previous[k], k, following[k]) <= 0:
+                reflex.add(k)
+            else:
+                reflex.discard(k)
+        i = n
+        tested = 0
+    triangles.append((previous[i], i, following[i]))
+    return triangles
+
+
+# Interleaves the bits of 2 arrays of 16 bits integers
+# Returns the Morton (Z-order curve) codes as an array of uint32
+def mortonCodes(x, y):
+    def spread(v):
+        v = np.asarray(v, dtype='uint32') & 0xFFFF
+        v = (v | (v << 8)) & 0x00FF00FF
+        v = (v | (v << 4)) & 0x0F0F0F0F
+        v = (v | (v << 2)) & 0x33333333
+        v = (v | (v << 1)) & 0x55555555
+        return v
+    return spread(x) | (spread(y) << 1)
+
+
+# Vertex cache optimization based on Tom Forsyth's algorithm
+# https://tomforsyth1000.github.io/papers/fast_vert_cache_opt.html
+# Returns the order in which the faces (T, 3) should be drawn.
+# When no face uses a vertex of the cache, the first face left in the input
+# order is used.
+def vertexCacheOrder(faces, cacheSize=32):
+    faces = np.asarray(faces, dtype='int').reshape(-1, 3)
+    if len(faces) == 0:
+        return np.zeros(0, dtype='int')
+    vertexCount = int(faces.max()) + 1
+
+    # Faces of each vertex
+    corners = faces.ravel()
+    valences = np.bincount(corners, minlength=vertexCount)
+    offsets = np.concatenate(([0], np.cumsum(valences))).tolist()
+    vertexFaces = (np.argsort(corners, kind='stable') // 3).tolist()
+    vertexFaces = [vertexFaces[offsets[i]:offsets[i + 1]]
+                   for i in range(vertexCount)]
+
+    # Scores depending on the position in the cache and the number of faces left
+    cacheScores = [0.75] * 3 + [
+        (1.0 - (i - 3) / (cacheSize - 3)) ** 1.5 for i in range(3, cacheSize)]
+    valenceScores = [0.0] + [
+        2.0 * i ** -0.5 for i in range(1, int(valences.max()) + 1)]
+
+    remaining = valences.tolist()
+    vertexScores = [valenceScores[n] for n in remaining]
+    faceList = faces.tolist()
+    faceScores = [sum(vertexScores[v] for v in face) for face in faceList]
+    drawn = [False] * len(faceList)
+    cache = []
+    order = []
+    nextFace = 0
+    best = -1
+    for _ in range(len(faceList)):
+        if best < 0:
+            while drawn[nextFace]:
+                nextFace += 1
+            best = nextFace
+        order.append(best)
+        drawn[best] = True
+        face = faceList[best]
+        for v in face:
+            remaining[v] -= 1
+            vertexFaces[v].remove(best)
+
+        # The vertices of the face go to the front of the cache
+        cache = face + [v for v in cache if v not in face]
+        evicted = cache[cacheSize:]
+        cache = cache[:cacheSize]
+
+        for v in evicted:
+            score = valenceScores[remaining[v]]
+            delta = score - vertexScores[v]
+            vertexScores[v] = score
+            for f in vertexFaces[v]:
+                faceScores[f] += delta
+
+        best = -1
+        bestScore = -1.0
+        for position, v in enumerate(cache):
+            if remaining[v]:
+                score = cacheScores[position] + valenceScores[remaining[v]]
+            else:
+                score = 0.0
+            delta = score - vertexScores[v]
+            vertexScores[v] = score
+            for f in vertexFaces[v]:
+                faceScores[f] += delta
+        for v in cache:
+            for f in vertexFaces[v]:
+                if faceScores[f] > bestScore:
+                    best = f
+                    bestScore = faceScores[f]
+    return np.array(order, dtype='int')
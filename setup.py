@@ -10,7 +10,7 @@ from setuptools import find_packages, setup
 if '/home/docs/checkouts/readthedocs' in os.getcwd():
     requires = []
 else:
-    requires = ['numpy', 'shapely']
+    requires = ['numpy', 'shapely>=2.0']
 
 setup(name='quantized-mesh-tile',
       version='0.6.1',
@@ -2,7 +2,10 @@
 
 import unittest
 
+import numpy as np
+
 import quantized_mesh_tile.cartesian3d as c3d
+from quantized_mesh_tile import encode
 from quantized_mesh_tile.bbsphere import BoundingSphere
 from quantized_mesh_tile.global_geodetic import GlobalGeodetic
 from quantized_mesh_tile.llh_ecef import LLH2ECEF
@@ -79,3 +82,57 @@ class TestBoundingSphere(unittest.TestCase):
         for coord in coords:
             distance = c3d.distance(sphere.center, coord)
             self.assertLessEqual(distance, sphere.radius)
+
+    def testBoundingSphereExact(self):
+        x = 533
+        y = 383
+        z = 9
+
+        geodetic = GlobalGeodetic(True)
+        [minx, miny, maxx, maxy] = geodetic.TileBounds(x, y, z)
+        ter = TerrainTile(west=minx, south=miny, east=maxx, north=maxy)
+        ter.fromFile('tests/data/%s_%s_%s.terrain' % (z, x, y))
+
+        coords = [LLH2ECEF(*coord) for coord in ter.getVerticesCoordinates()]
+        ritter = BoundingSphere()
+        ritter.fromPoints(coords)
+        sphere = BoundingSphere()
+        sphere.fromPoints(np.array(coords), exact=True)
+        self.assertLessEqual(sphere.radius, ritter.radius)
+        distances = np.linalg.norm(np.array(coords) - sphere.center, axis=1)
+        self.assertTrue(np.all(distances <= sphere.radius))
+
+        # Minimal sphere of a regular tetrahedron
+        points = [[1, 1, 1], [1, -1, -1], [-1, 1, -1], [-1, -1, 1]]
+        sphere = BoundingSphere()
+        sphere.fromPoints(points, exact=True)
+        self.assertAlmostEqual(sphere.radius, 3 ** 0.5)
+        for i in range(3):
+            self.assertAlmostEqual(sphere.center[i], 0.0)
+
+    def testBoundingSphereRitterRegression(self):
+        # The sphere used to be grown for points already within it, which
+        # could shrink it and leave the point at 15.565 of its center out
+        points = [[-4.0, 10.0, -9.0], [-6.0, 0.0, -2.0], [-5.0, 4.0, 3.0],
+                  [9.0, 8.0, 10.0], [-3.0, -9.0, -3.0], [0.0, -7.0, -8.0],
+                  [-1.0, 9.0, 5.0], [-4.0, 8.0, 4.0]]
+        sphere = BoundingSphere()
+        sphere.fromPoints(points)
+        self.assertAlmostEqual(sphere.radius, 15.376932753530406)
+        distances = np.linalg.norm(np.array(points) - sphere.center, axis=1)
+        self.assertTrue(np.all(distances <= sphere.radius + 1e-9))
+
+    def testBoundingSphereExactTile(self):
+        geodetic = GlobalGeodetic(True)
+        bounds = geodetic.TileBounds(533, 383, 9)
+        ter = TerrainTile(west=bounds[0], south=bounds[1], east=bounds[2],
+                          north=bounds[3])
+        ter.fromFile('tests/data/9_533_383.terrain')
+        triangles = ter.getTrianglesCoordinates()
+
+        tile = encode(triangles, bounds=bounds)
+        exactTile = encode(triangles, bounds=bounds, exactBoundingSphere=True)
+        self.assertAlmostEqual(
+            tile.header['boundingSphereRadius'], 24100.510296226825, places=6)
+        self.assertAlmostEqual(
+            exactTile.header['boundingSphereRadius'], 23977.90278926471, places=6)
@@ -3,7 +3,9 @@
 import os
 import unittest
 
-from quantized_mesh_tile import decode, encode
+import numpy as np
+
+from quantized_mesh_tile import decode, encode, probe
 from quantized_mesh_tile.global_geodetic import GlobalGeodetic
 
 # Partial tile
@@ -91,3 +93,54 @@ class TestTopology(unittest.TestCase):
         # east edge now has data
         self.assertGreater(len(ter.eastI), 0)
         self.assertEqual(len(ter.eastI), len(ter2.eastI))
+
+    def testEncodeOutsideBounds(self):
+        # The quantized vertices do not fit in the tile
+        ter = encode([[[0, 0, 1], [3, 0, 2], [0, 3, 3]]], bounds=[0, 0, 2, 2])
+        with self.assertRaises(ValueError):
+            ter.toBytesIO()
+
+    def testEncodeArrays(self):
+        ter = encode(geometries)
+        terA = encode(np.array(geometries))
+        self.assertEqual(ter.toBytesIO().getvalue(), terA.toBytesIO().getvalue())
+
+    def testEncodeObjectArrayAutocorrect(self):
+        quad = 'POLYGON Z ((0 0 1, 1 0 2, 1 1 3, 0 1 4, 0 0 1))'
+        ter = encode([quad], autocorrectGeometries=True)
+        terA = encode(np.array([quad], dtype=object), autocorrectGeometries=True)
+        self.assertEqual(len(terA.indices), 6)
+        self.assertEqual(ter.toBytesIO().getvalue(), terA.toBytesIO().getvalue())
+        with self.assertRaises(ValueError):
+            encode(np.array([quad], dtype=object))
+
+    def testEncodeOptimizeOrder(self):
+        bounds = GlobalGeodetic(True).TileBounds(0, 0, 0)
+        ter = encode(geometries, bounds=bounds)
+        for kwargs in ({'optimizeOrder': True}, {'mortonOrder': True},
+                       {'optimizeOrder': True, 'mortonOrder': True}):
+            terO = encode(geometries, bounds=bounds, **kwargs)
+            terO.toFile(self.tmpfile)
+            ter2 = decode(self.tmpfile, bounds)
+            os.remove(self.tmpfile)
+            self.assert_tile(terO, ter2)
+            # Same triangles in another order
+            self.assertEqual(len(terO.u), len(ter.u))
+            self.assertEqual(sorted(map(tuple, terO.getTrianglesCoordinates())),
+                             sorted(map(tuple, ter.getTrianglesCoordinates())))
+
+    def testProbe(self):
+        ter = encode(geometries)
+        ter.toFile(self.tmpfile, gzipped=True)
+        header = probe(self.tmpfile)
+        self.assertEqual(header['vertexCount'], len(ter.u))
+        self.assertEqual(len(header), len(ter.header) + 1)
+        self.assertAlmostEqual(header['boundingSphereRadius'],
+                               ter.header['boundingSphereRadius'])
+        self.assertAlmostEqual(header['minimumHeight'], -7.144, places=3)
+        self.assertAlmostEqual(header['maximumHeight'], 50.312, places=3)
+
+        # Same values from the uncompressed file
+        ungzipped = probe('tests/data/10_1563_590_light_watermask.terrain')
+        gzipped = probe('tests/data/10_1563_590_light_watermask.terrain.gz')
+        self.assertEqual(ungzipped, gzipped)
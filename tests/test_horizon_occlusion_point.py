@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from quantized_mesh_tile import horizon_occlusion_point as occ
+from quantized_mesh_tile.bbsphere import BoundingSphere
+from quantized_mesh_tile.llh_ecef import LLH2ECEF
+
+
+class TestHorizonOcclusionPoint(unittest.TestCase):
+
+    def testFromPoints(self):
+        coords = [LLH2ECEF(lon, lat, h)
+                  for lon in (7.0, 7.05, 7.1)
+                  for lat in (46.0, 46.05, 46.1)
+                  for h in (0.0, 450.0, 3000.0)]
+        sphere = BoundingSphere()
+        sphere.fromPoints(coords)
+        point = occ.fromPoints(coords, sphere)
+
+        center = [sphere.center[0] * occ.rX,
+                  sphere.center[1] * occ.rY,
+                  sphere.center[2] * occ.rZ]
+        magnitude = max(
+            occ.computeMagnitude([x * occ.rX, y * occ.rY, z * occ.rZ], center)
+            for x, y, z in coords
+        )
+        self.assertEqual(len(point), 3)
+        for i in range(3):
+            self.assertAlmostEqual(point[i], center[i] * magnitude, places=12)
+
+        self.assertEqual(occ.fromPoints(np.array(coords), sphere), point)
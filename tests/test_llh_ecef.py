@@ -2,7 +2,10 @@
 
 import unittest
 
-from quantized_mesh_tile.llh_ecef import ECEF2LLH, LLH2ECEF
+import numpy as np
+
+from quantized_mesh_tile.llh_ecef import (ECEF2LLH, LLH2ECEF, ECEF2LLHArray,
+                                          LLH2ECEFArray, LLH2ECEFGrid)
 
 # Conversion reference
 # http://www.oc.nps.edu/oc2902w/coord/llhxyz.htm
@@ -59,3 +62,37 @@ class TestLLFECEF(unittest.TestCase):
         self.assertEqual(round(lon, 5), 7.81471)
         self.assertEqual(round(lat, 6), 46.306686)
         self.assertEqual(round(alt), 635.0)
+
+    def testArrays(self):
+        llh = np.array([[0, 0, 0],
+                        [7.43861, 46.951103, 552],
+                        [7.81512, 46.30447, 635.0],
+                        [-120.2, -33.3, -10.5]])
+        xyz = LLH2ECEFArray(llh)
+        self.assertEqual(xyz.shape, (4, 3))
+        self.assertEqual(xyz.dtype, np.float64)
+        for i, coord in enumerate(llh):
+            self.assertTrue(np.allclose(xyz[i], LLH2ECEF(*coord), rtol=0, atol=1e-6))
+
+        llh2 = ECEF2LLHArray(xyz)
+        for i, coord in enumerate(xyz):
+            self.assertTrue(np.allclose(llh2[i], ECEF2LLH(*coord), rtol=0, atol=1e-6))
+        self.assertTrue(np.allclose(llh2, llh, rtol=0, atol=1e-6))
+
+        # Preallocated output, also in place
+        out = np.empty((4, 3))
+        self.assertIs(LLH2ECEFArray(llh, out=out), out)
+        self.assertTrue(np.array_equal(out, xyz))
+        inPlace = llh.copy()
+        LLH2ECEFArray(inPlace, out=inPlace)
+        self.assertTrue(np.array_equal(inPlace, xyz))
+
+    def testGrid(self):
+        lons = np.array([7.4, 7.45, 7.5])
+        lats = np.array([47.0, 46.9])
+        alts = np.array([[552.0, 600.5, 610.2],
+                         [635.0, 0.0, -10.5]])
+        xyz = LLH2ECEFGrid(lons, lats, alts)
+        self.assertEqual(xyz.shape, (2, 3, 3))
+        llh = np.column_stack((np.tile(lons, 2), np.repeat(lats, 3), alts.ravel()))
+        self.assertTrue(np.array_equal(xyz.reshape(-1, 3), LLH2ECEFArray(llh)))
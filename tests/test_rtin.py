@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from quantized_mesh_tile.rtin import RTIN
+from quantized_mesh_tile.terrain import TerrainTile
+
+bounds = [7.0, 46.0, 7.1, 46.1]
+
+
+class TestRTIN(unittest.TestCase):
+
+    def setUp(self):
+        x, y = np.meshgrid(np.linspace(0, 3, 17), np.linspace(0, 3, 17))
+        noise = np.random.RandomState(1).uniform(0, 1, x.shape)
+        self.heights = 100 * np.sin(x) * np.cos(2 * y) + 500 + noise
+
+    def testFlatGrid(self):
+        rtin = RTIN(np.full((17, 17), 350.0), bounds)
+        topology = rtin.getTopology(0.0)
+        self.assertEqual(len(topology.faces), 2)
+        self.assertEqual(len(topology.vertices), 4)
+        self.assertEqual(topology.minLon, 7.0)
+        self.assertEqual(topology.maxLat, 46.1)
+
+    def testMaxError(self):
+        rtin = RTIN(self.heights, bounds)
+        self.assertEqual(rtin.errors.shape, (17, 17))
+
+        # No error allowed, all the grid points are used
+        faces = rtin.getFaces(0.0)
+        self.assertEqual(len(faces), 2 * 16 * 16)
+
+        counts = []
+        for maxError in (0.5, 2.0, 10.0, 50.0):
+            faces = rtin.getFaces(maxError)
+            # The grid points left out of the mesh are within the error
+            leftOut = np.ones(17 * 17, dtype=bool)
+            leftOut[faces.ravel()] = False
+            self.assertTrue(np.all(rtin.errors.ravel()[leftOut] <= maxError))
+            counts.append(len(faces))
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertLess(counts[-1], counts[0])
+
+        # The faces cover the grid and are counter clockwise in lon/lat
+        x = faces % 17
+        y = -(faces // 17)
+        cross = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - \
+            (y[:, 1] - y[:, 0]) * (x[:, 2] - x[:, 0])
+        self.assertTrue(np.all(cross > 0))
+        self.assertEqual(np.sum(cross), 2 * 16 * 16)
+
+    def testTopology(self):
+        rtin = RTIN(self.heights, bounds)
+        topology = rtin.getTopology(2.0, hasLighting=True)
+        faces = rtin.getFaces(2.0)
+        self.assertEqual(len(topology.faces), len(faces))
+        self.assertEqual(len(topology.vertices), len(np.unique(faces)))
+        self.assertEqual(topology.verticesUnitVectors.shape, topology.vertices.shape)
+
+        tile = TerrainTile(topology=topology, west=bounds[0], south=bounds[1],
+                           east=bounds[2], north=bounds[3])
+        self.assertEqual(len(tile.indices), 3 * len(faces))
+        self.assertEqual(len(tile.westI), len(tile.eastI))
+
+    def testBadGrid(self):
+        with self.assertRaises(ValueError):
+            RTIN(np.zeros((16, 16)), bounds)
+        with self.assertRaises(ValueError):
+            RTIN(np.zeros((17, 9)), bounds)
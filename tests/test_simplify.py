@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from quantized_mesh_tile.simplify import simplify, simplifyMesh
+from quantized_mesh_tile.terrain import TerrainTile
+from quantized_mesh_tile.topology import TerrainTopology
+
+bounds = [7.0, 46.0, 7.1, 46.1]
+
+
+def onBounds(vertices):
+    return (vertices[:, 0] == bounds[0]) | (vertices[:, 0] == bounds[2]) | \
+        (vertices[:, 1] == bounds[1]) | (vertices[:, 1] == bounds[3])
+
+
+def orientations(topology):
+    v = topology.vertices
+    f = topology.faces
+    e1 = v[f[:, 1]] - v[f[:, 0]]
+    e2 = v[f[:, 2]] - v[f[:, 0]]
+    return e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]
+
+
+def validCollapses(vertices, faces, locked):
+    # The half edge collapses which keep the link condition and the orientations
+    faces = faces.tolist()
+    collapses = []
+    for u in np.where(~locked)[0].tolist():
+        facesU = [f for f in faces if u in f]
+        neighboursU = set(w for f in facesU for w in f)
+        for v in neighboursU - {u}:
+            neighboursV = set(w for f in faces if v in f for w in f)
+            opposite = set(w for f in facesU if v in f for w in f)
+            if neighboursU & neighboursV != opposite:
+                continue
+            moved = [f for f in facesU if v not in f]
+            before = [vertices[f] for f in moved]
+            after = [vertices[[v if w == u else w for w in f]] for f in moved]
+            if all(cross(a) * cross(b) > 0 for a, b in zip(before, after)):
+                collapses.append((u, v))
+    return collapses
+
+
+def cross(triangle):
+    e1 = triangle[1] - triangle[0]
+    e2 = triangle[2] - triangle[0]
+    return e1[0] * e2[1] - e1[1] * e2[0]
+
+
+class TestSimplify(unittest.TestCase):
+
+    def setUp(self):
+        x, y = np.meshgrid(np.linspace(0, 3, 33), np.linspace(0, 3, 33))
+        noise = np.random.RandomState(1).uniform(0, 1, x.shape)
+        heights = 100 * np.sin(x) * np.cos(2 * y) + 500 + noise
+        self.topology = TerrainTopology.fromHeightGrid(heights, bounds)
+
+    def testMaxTriangles(self):
+        topology = simplify(self.topology, maxTriangles=300)
+        self.assertIsInstance(topology, TerrainTopology)
+        self.assertEqual(len(topology.faces), 300)
+
+        # The vertices on the bounds are kept
+        self.assertEqual(np.sum(onBounds(topology.vertices)), 4 * 32)
+        self.assertEqual(
+            sorted(topology.vertices[onBounds(topology.vertices)].tolist()),
+            sorted(self.topology.vertices[onBounds(self.topology.vertices)].tolist()))
+
+        # The faces are counter clockwise and still cover the tile
+        cross = orientations(topology)
+        self.assertTrue(np.all(cross > 0))
+        self.assertAlmostEqual(np.sum(cross) * 0.5, 0.1 * 0.1)
+
+    def testMaxError(self):
+        counts = []
+        for maxError in (0.5, 5.0, 50.0):
+            topology = simplify(self.topology, maxError=maxError)
+            counts.append(len(topology.faces))
+            self.assertTrue(np.all(orientations(topology) > 0))
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertLess(counts[0], len(self.topology.faces))
+
+        # A small plane is reduced to its bounds (the curvature of the earth is
+        # negligible), except a vertex may be needed to avoid flat triangles
+        smallBounds = [7.0, 46.0, 7.001, 46.001]
+        x, y = np.meshgrid(np.arange(17), np.arange(17))
+        topology = TerrainTopology.fromHeightGrid(2.0 * x + y, smallBounds)
+        topology = simplify(topology, maxError=0.01, bounds=smallBounds)
+        self.assertLessEqual(len(topology.vertices), 4 * 16 + 1)
+        self.assertLessEqual(len(topology.faces), 4 * 16)
+
+    def testTerrainTile(self):
+        tile = TerrainTile(topology=self.topology, west=bounds[0], south=bounds[1],
+                           east=bounds[2], north=bounds[3])
+        tile.fromBuffer(tile.toBuffer())
+        simplified = simplify(tile, maxTriangles=500)
+        self.assertIsInstance(simplified, TerrainTile)
+        self.assertEqual(len(simplified.indices), 3 * 500)
+        for edge in ('westI', 'southI', 'eastI', 'northI'):
+            self.assertEqual(len(getattr(simplified, edge)), len(getattr(tile, edge)))
+        self.assertEqual(
+            sorted(np.asarray(simplified.v)[simplified.westI].tolist()),
+            sorted(np.asarray(tile.v)[tile.westI].tolist()))
+
+    def testBadArguments(self):
+        with self.assertRaises(ValueError):
+            simplify(self.topology)
+        with self.assertRaises(ValueError):
+            simplify([], maxTriangles=10)
+
+    def testRejectedCollapses(self):
+        # A jittered 5 * 5 grid where a collapse is first rejected and becomes
+        # valid after a neighbouring collapse
+        size = 5
+        rng = np.random.RandomState(2167)
+        x, y = np.meshgrid(np.linspace(0, 1, size), np.linspace(0, 1, size))
+        jitter = rng.uniform(-0.3, 0.3, (size, size, 2)) / (size - 1)
+        jitter[[0, -1]] = 0
+        jitter[:, [0, -1]] = 0
+        vertices = np.column_stack(((x + jitter[..., 0]).ravel() * 0.01 + 7,
+                                    (y + jitter[..., 1]).ravel() * 0.01 + 46,
+                                    rng.uniform(0, 100, size * size)))
+        nw = (np.arange(size - 1)[:, np.newaxis] * size +
+              np.arange(size - 1)).ravel()
+        faces = np.concatenate((np.column_stack((nw, nw + 1, nw + size + 1)),
+                                np.column_stack((nw, nw + size + 1, nw + size))))
+        locked = np.zeros(size * size, dtype=bool)
+        locked[:size] = locked[-size:] = locked[::size] = \
+            locked[size - 1::size] = True
+
+        # The simplification stops when no valid collapse is left
+        simplified = simplifyMesh(vertices, faces, locked, maxTriangles=0)
+        self.assertEqual(validCollapses(vertices, simplified, locked), [])
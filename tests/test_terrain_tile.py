@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
 
+import copy
 import io
+import mmap
 import os
+import pickle
 import unittest
+from struct import pack
+
+import numpy as np
 
 from quantized_mesh_tile.global_geodetic import GlobalGeodetic
-from quantized_mesh_tile.terrain import TerrainTile
+from quantized_mesh_tile.terrain import TILEPXS, TerrainTile
 from quantized_mesh_tile.topology import TerrainTopology
 
 
+class TaggedTerrainTile(TerrainTile):
+    # A subclass with its own slot and a __dict__
+    __slots__ = ('zoom', '__dict__')
+
+
 class TestTerrainTile(unittest.TestCase):
     def setUp(self):
         self.tmpfile = 'tests/data/temp.terrain'
@@ -102,6 +113,52 @@ class TestTerrainTile(unittest.TestCase):
         self.assertEqual(ter2.getContentType(),
                          'application/vnd.quantized-mesh')
 
+    def testVerticesDecodedAsArrays(self):
+        ter = TerrainTile()
+        ter.fromFile('tests/data/9_533_383.terrain')
+
+        for values in (ter.u, ter.v, ter.h):
+            self.assertIsInstance(values, np.ndarray)
+            self.assertEqual(values.dtype, np.uint16)
+            self.assertEqual(len(values), len(ter.u))
+            self.assertLessEqual(values.max(), TerrainTile.MAX)
+        # Corners of the tile are part of the mesh
+        self.assertEqual(ter.u.min(), TerrainTile.MIN)
+        self.assertEqual(ter.u.max(), TerrainTile.MAX)
+        self.assertEqual(ter.v.min(), TerrainTile.MIN)
+        self.assertEqual(ter.v.max(), TerrainTile.MAX)
+
+    def testCompactTile(self):
+        filePath = 'tests/data/9_533_383.terrain'
+        ter = TerrainTile()
+        ter.fromFile(filePath)
+        terC = TerrainTile(compact=True)
+        terC.fromFile(filePath)
+
+        self.assertFalse(hasattr(terC, '__dict__'))
+        self.assertEqual(terC.indices.dtype, np.uint16)
+        for name in ('westI', 'southI', 'eastI', 'northI'):
+            values = getattr(terC, name)
+            self.assertIsInstance(values, np.ndarray)
+            self.assertEqual(values.dtype, np.uint16)
+            self.assertEqual(values.tolist(), getattr(ter, name))
+        self.assertEqual(terC.getVerticesCoordinates(), ter.getVerticesCoordinates())
+        self.assertIsInstance(terC._longs, np.ndarray)
+        self.assertEqual(bytes(terC.toBuffer()), bytes(ter.toBuffer()))
+
+        wkts = [
+            'POLYGON Z ((0.0 0.0 1.0, 0.0 1.0 1.0, 1.0 1.0 1.0, 0.0 0.0 1.0))',
+            'POLYGON Z ((0.0 0.0 1.0, 1.0 0.0 1.0, 1.0 1.0 1.0, 0.0 0.0 1.0))'
+        ]
+        topology = TerrainTopology(geometries=wkts)
+        tile = TerrainTile(topology=topology)
+        tileC = TerrainTile(topology=topology, compact=True)
+        self.assertEqual(tileC.u.dtype, np.uint16)
+        self.assertEqual(tileC.indices.dtype, np.uint16)
+        self.assertEqual(tileC.u.tolist(), tile.u)
+        self.assertEqual(tileC.westI.tolist(), tile.westI)
+        self.assertEqual(bytes(tileC.toBuffer()), bytes(tile.toBuffer()))
+
     def testWatermaskOnlyReader(self):
         z = 9
         x = 769
@@ -134,6 +191,33 @@ class TestTerrainTile(unittest.TestCase):
         self.assertEqual(ter2.getContentType(),
                          'application/vnd.quantized-mesh;extensions=watermask')
 
+    def testWatermaskArray(self):
+        ter = TerrainTile()
+        ter.fromFile('tests/data/9_769_319_watermask.terrain')
+        self.assertIsInstance(ter.watermask, np.ndarray)
+        self.assertEqual(ter.watermask.dtype, np.uint8)
+        self.assertEqual(ter.watermask.shape, (256, 256))
+
+        # Flat list of values
+        mask = ter.watermask.ravel().tolist()
+        ter.watermask = mask
+        data = ter.toBuffer()
+        ter2 = TerrainTile()
+        ter2.fromBuffer(data)
+        self.assertEqual(ter2.watermask.ravel().tolist(), mask)
+
+        # Uniform watermasks are written as one byte
+        size = ter.getByteSize()
+        for value in (0, 255):
+            ter.watermask = np.full((256, 256), value, dtype='uint8')
+            self.assertEqual(ter.getByteSize(), size - TILEPXS + 1)
+            ter2.fromBuffer(ter.toBuffer())
+            self.assertEqual(ter2.watermask.tolist(), [[value]])
+
+        ter.watermask = [[1, 2], [3, 4]]
+        with self.assertRaises(Exception):
+            ter.toBuffer()
+
     def testExtensionsReader(self):
         z = 10
         x = 1563
@@ -252,6 +336,35 @@ class TestTerrainTile(unittest.TestCase):
         fileLike = tile.toBytesIO()
         self.assertIsInstance(fileLike, io.BytesIO)
 
+    def testTileEdgesFromTopology(self):
+        geodetic = GlobalGeodetic(True)
+        [minx, miny, maxx, maxy] = geodetic.TileBounds(533, 383, 9)
+        ter = TerrainTile(west=minx, south=miny, east=maxx, north=maxy)
+        ter.fromFile('tests/data/9_533_383.terrain')
+        topology = TerrainTopology(geometries=ter.getTrianglesCoordinates())
+
+        tile = TerrainTile(topology=topology,
+                           west=minx, south=miny, east=maxx, north=maxy)
+        # Vertices listed once, in the order of their first use
+        firstUse = []
+        for i in tile.indices:
+            if i not in firstUse:
+                firstUse.append(i)
+        self.assertGreater(len(tile.westI), 0)
+        self.assertEqual(tile.westI, [i for i in firstUse if tile.u[i] == 0])
+        self.assertEqual(tile.eastI, [i for i in firstUse if tile.u[i] == 32767])
+        self.assertEqual(tile.southI, [i for i in firstUse if tile.v[i] == 0])
+        self.assertEqual(tile.northI, [i for i in firstUse if tile.v[i] == 32767])
+
+        tileS = TerrainTile(topology=topology, sortEdges=True,
+                            west=minx, south=miny, east=maxx, north=maxy)
+        self.assertEqual(sorted(tileS.westI), sorted(tile.westI))
+        self.assertEqual(sorted(tileS.southI), sorted(tile.southI))
+        westV = [tileS.v[i] for i in tileS.westI]
+        self.assertEqual(westV, sorted(westV))
+        southU = [tileS.u[i] for i in tileS.southI]
+        self.assertEqual(southU, sorted(southU))
+
     def testGzippedTileCreationFromTopology(self):
         wkts = [
             'POLYGON Z ((0.0 0.0 1.0, 0.0 1.0 1.0, 1.0 1.0 1.0, 0.0 0.0 1.0))',
@@ -274,6 +387,171 @@ class TestTerrainTile(unittest.TestCase):
         fileLike = tile.toBytesIO(gzipped=True)
         self.assertIsInstance(fileLike, io.BytesIO)
 
+    def testReadHeader(self):
+        ter = TerrainTile()
+        ter.fromFile('tests/data/9_533_383.terrain')
+        with open('tests/data/9_533_383.terrain', 'rb') as f:
+            header = TerrainTile.readHeader(f)
+            # Only the header and the vertex count have been consumed
+            self.assertEqual(f.tell(), 92)
+        self.assertEqual(header.pop('vertexCount'), len(ter.u))
+        self.assertEqual(list(header.keys()),
+                         list(TerrainTile.quantizedMeshHeader.keys()))
+        for k, v in ter.header.items():
+            self.assertEqual(v, header[k], 'For k = ' + k)
+
+        with self.assertRaises(Exception):
+            TerrainTile.readHeader(io.BytesIO(b'\x00' * 10))
+
+    def testLazyReader(self):
+        filePath = 'tests/data/10_1563_590_light_watermask.terrain'
+        ter = TerrainTile()
+        ter.fromFile(filePath, hasLighting=True, hasWatermask=True)
+        terL = TerrainTile()
+        terL.fromFile(filePath, hasLighting=True, hasWatermask=True, lazy=True)
+
+        self.assertEqual(len(terL._lazySections), 10)
+        self.assertEqual(terL.header, ter.header)
+        # Nothing to decode, the encoded sections are copied
+        with open(filePath, 'rb') as f:
+            self.assertEqual(bytes(terL.toBuffer()), f.read())
+        self.assertEqual(len(terL._lazySections), 10)
+
+        self.assertEqual(list(terL.v), list(ter.v))
+        self.assertNotIn('v', terL._lazySections)
+        self.assertIn('u', terL._lazySections)
+
+        # Rewrite an edge only
+        terL.westI = terL.westI[:-1]
+        ter.westI = ter.westI[:-1]
+        self.assertEqual(len(terL._lazySections), 8)
+        self.assertEqual(bytes(terL.toBuffer()), bytes(ter.toBuffer()))
+
+        self.assertEqual(list(terL.indices), list(ter.indices))
+        self.assertEqual(terL.northI, ter.northI)
+        self.assertTrue(np.array_equal(terL.vLight, ter.vLight))
+        self.assertEqual(terL.watermask.tolist(), ter.watermask.tolist())
+        for name in ('u', 'h', 'southI', 'eastI'):
+            getattr(terL, name)
+        self.assertEqual(len(terL._lazySections), 0)
+        self.assertIsNone(terL._lazyData)
+
+    def testLazyReaderPickleCopy(self):
+        filePath = 'tests/data/10_1563_590_light_watermask.terrain'
+        ter = TerrainTile()
+        ter.fromFile(filePath, hasLighting=True, hasWatermask=True)
+        terL = TerrainTile()
+        terL.fromFile(filePath, hasLighting=True, hasWatermask=True, lazy=True)
+        self.assertEqual(list(terL.v), list(ter.v))
+
+        for tile in (pickle.loads(pickle.dumps(terL)), copy.deepcopy(terL),
+                     copy.copy(terL)):
+            # The sections are still decoded on first access
+            self.assertEqual(len(tile._lazySections), 9)
+            self.assertEqual(tile.header, ter.header)
+            self.assertEqual(list(tile.u), list(ter.u))
+            self.assertEqual(list(tile.v), list(ter.v))
+            self.assertEqual(list(tile.indices), list(ter.indices))
+            self.assertTrue(np.array_equal(tile.vLight, ter.vLight))
+            self.assertEqual(tile.watermask.tolist(), ter.watermask.tolist())
+            self.assertEqual(bytes(tile.toBuffer()), bytes(ter.toBuffer()))
+        self.assertEqual(len(terL._lazySections), 9)
+
+        # Eager tiles
+        tile = pickle.loads(pickle.dumps(ter))
+        self.assertEqual(bytes(tile.toBuffer()), bytes(ter.toBuffer()))
+
+        # The attributes of subclasses are kept
+        tile = TaggedTerrainTile()
+        tile.fromFile(filePath, hasLighting=True, hasWatermask=True, lazy=True)
+        tile.tag = '10/1563/590'
+        tile.zoom = 10
+        for copied in (pickle.loads(pickle.dumps(tile)), copy.deepcopy(tile)):
+            self.assertIsInstance(copied, TaggedTerrainTile)
+            self.assertEqual(copied.tag, '10/1563/590')
+            self.assertEqual(copied.zoom, 10)
+            self.assertEqual(list(copied.indices), list(ter.indices))
+
+    def testMemoryMappedReader(self):
+        filePath = 'tests/data/10_1563_590_light_watermask.terrain'
+        ter = TerrainTile()
+        ter.fromFile(filePath, hasLighting=True, hasWatermask=True, lazy=True)
+        # Sections are views on the mapped file
+        self.assertIsInstance(ter._lazyData.obj, mmap.mmap)
+        indices = list(ter.indices)
+
+        terG = TerrainTile()
+        terG.fromFile(filePath + '.gz', hasLighting=True, hasWatermask=True,
+                      gzipped=True, lazy=True)
+        self.assertIsInstance(terG._lazyData.obj, bytes)
+        self.assertEqual(list(terG.indices), indices)
+
+        with open(filePath, 'rb') as f:
+            terB = TerrainTile()
+            terB.fromBuffer(f.read(), hasLighting=True, hasWatermask=True)
+        self.assertEqual(list(terB.indices), indices)
+        self.assertIsNone(terB._lazyData)
+
+    def testExtensionsDetection(self):
+        filePath = 'tests/data/10_1563_590_light_watermask.terrain'
+        ter = TerrainTile()
+        ter.fromFile(filePath)
+        self.assertTrue(ter.hasLighting)
+        self.assertTrue(ter.hasWatermask)
+        self.assertEqual(len(ter.vLight), len(ter.u))
+        self.assertEqual(ter.watermask.tolist(), [[255]])
+
+        # Compression is detected as well
+        terG = TerrainTile()
+        terG.fromFile(filePath + '.gz')
+        self.assertTrue(np.array_equal(terG.vLight, ter.vLight))
+        self.assertEqual(terG.watermask.tolist(), ter.watermask.tolist())
+
+        # Skip the lighting extension
+        terW = TerrainTile()
+        terW.fromFile(filePath, hasLighting=False)
+        self.assertFalse(terW.hasLighting)
+        self.assertEqual(terW.vLight, [])
+        self.assertEqual(terW.watermask.tolist(), [[255]])
+
+        # Unknown extensions are skipped
+        with open(filePath, 'rb') as f:
+            data = f.read() + pack('<BI', 4, 3) + b'{ }'
+        terU = TerrainTile()
+        terU.fromBytesIO(io.BytesIO(data))
+        self.assertTrue(np.array_equal(terU.vLight, ter.vLight))
+        self.assertEqual(terU.watermask.tolist(), ter.watermask.tolist())
+        with self.assertRaises(Exception):
+            terU.fromBytesIO(io.BytesIO(data[:-1]))
+
+        ter = TerrainTile()
+        ter.fromFile('tests/data/9_533_383.terrain')
+        self.assertFalse(ter.hasLighting)
+        self.assertFalse(ter.hasWatermask)
+
+    def testToBuffer(self):
+        ter = TerrainTile()
+        ter.fromFile('tests/data/10_1563_590_light_watermask.terrain',
+                     hasLighting=True, hasWatermask=True)
+        size = ter.getByteSize()
+        self.assertEqual(size, os.path.getsize(
+            'tests/data/10_1563_590_light_watermask.terrain'))
+
+        data = ter.toBuffer()
+        self.assertEqual(len(data), size)
+        self.assertEqual(bytes(data), ter.toBytesIO().getvalue())
+
+        # Reuse a larger buffer
+        buff = bytearray(size + 10)
+        view = ter.toBuffer(buff, offset=10)
+        self.assertEqual(bytes(view), bytes(data))
+        self.assertEqual(bytes(buff[10:]), bytes(data))
+
+        with self.assertRaises(ValueError):
+            ter.toBuffer(bytearray(size - 1))
+        with self.assertRaises(ValueError):
+            ter.toBuffer(bytes(size))
+
     def testFromBytesIO(self):
         z = 10
         x = 1563
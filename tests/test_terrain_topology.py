@@ -2,7 +2,12 @@
 
 import unittest
 
+import numpy as np
+import shapely
+
+from quantized_mesh_tile.llh_ecef import LLH2ECEFArray
 from quantized_mesh_tile.topology import TerrainTopology
+from quantized_mesh_tile.utils import computeNormals
 
 # Must be defined counter clock wise order
 vertices_1 = [
@@ -135,6 +140,224 @@ class TestTopology(unittest.TestCase):
         self.assertEqual(topology.maxLat, 3.1)
         self.assertEqual(topology.maxHeight, 4.5)
 
+    def testTopologyFromArrays(self):
+        topology = TerrainTopology(geometries=[vertices_1, vertices_2])
+        topologyA = TerrainTopology.fromArrays(np.array([vertices_1, vertices_2]))
+
+        self.assertTrue(np.array_equal(topologyA.vertices, topology.vertices))
+        self.assertTrue(np.array_equal(topologyA.faces, topology.faces))
+        self.assertTrue(np.array_equal(topologyA.cartesianVertices,
+                                       topology.cartesianVertices))
+        self.assertEqual(topologyA.faces[1][0], 1)
+        self.assertEqual(topologyA.faces[1][1], 3)
+        self.assertEqual(topologyA.faces[1][2], 4)
+
+        # Merge vertices which are identical once rounded
+        vertices_3 = [[v[0] + 1e-9, v[1], v[2]] for v in vertices_2]
+        topologyA = TerrainTopology.fromArrays([vertices_1, vertices_3])
+        self.assertEqual(len(topologyA.vertices), 6)
+        topologyA = TerrainTopology.fromArrays([vertices_1, vertices_3], decimals=6)
+        self.assertEqual(len(topologyA.vertices), 5)
+
+        topologyA = TerrainTopology.fromArrays(
+            [vertices_1, vertices_2], hasLighting=True)
+        self.assertEqual(topologyA.verticesUnitVectors.shape, (5, 3))
+
+        with self.assertRaises(ValueError):
+            TerrainTopology.fromArrays([[1.0, 2.0, 3.0]])
+
+    def testTopologyFromGeometries(self):
+        topology = TerrainTopology(geometries=[vertices_1, vertices_2])
+        geometries = np.array([wkt_1, wkb_2], dtype=object)
+        topologyG = TerrainTopology.fromGeometries(geometries)
+
+        self.assertTrue(np.array_equal(topologyG.vertices, topology.vertices))
+        self.assertTrue(np.array_equal(topologyG.faces, topology.faces))
+
+        triangles = TerrainTopology._geometriesToTriangles([wkb_1, wkt_2])
+        self.assertEqual(triangles.tolist(), [vertices_1, vertices_2])
+
+        wkt = 'POLYGON Z ((2.1 3.1 3.3, 1.2 1.5 4.2, 3.2 2.2 4.5, 2.5 1.2 1.1,' \
+              ' 2.1 3.1 3.3))'
+        with self.assertRaises(ValueError):
+            TerrainTopology.fromGeometries([wkt_1, wkt])
+        with self.assertRaises(ValueError):
+            TerrainTopology.fromGeometries([wkt_1, 'POINT Z (2.1 2.2 3.3)'])
+        with self.assertRaises(ValueError):
+            TerrainTopology.fromGeometries([wkt_1, vertices_2])
+
+    def testTopologyReadWkbTriangles(self):
+        triangles = TerrainTopology._readWkbTriangles([wkb_1, wkb_2])
+        self.assertEqual(triangles.tolist(), [vertices_1, vertices_2])
+
+        polygons = shapely.polygons([vertices_1, vertices_2])
+        for geometries in (
+                shapely.to_wkb(polygons, byte_order=0),
+                shapely.to_wkb(polygons, flavor='iso'),
+                shapely.to_wkb(shapely.set_srid(polygons, 4326),
+                               include_srid=True)):
+            triangles = TerrainTopology._readWkbTriangles(list(geometries))
+            self.assertEqual(triangles.tolist(), [vertices_1, vertices_2])
+
+        # Mixed or non triangular geometries use Shapely
+        self.assertIsNone(TerrainTopology._readWkbTriangles([wkb_1, wkt_2]))
+        polygon = shapely.polygons(vertices_1 + [[2.5, 1.2, 1.1]])
+        self.assertIsNone(
+            TerrainTopology._readWkbTriangles([wkb_1, shapely.to_wkb(polygon)]))
+        self.assertIsNone(TerrainTopology._readWkbTriangles(
+            [wkb_1, shapely.to_wkb(polygons[1], byte_order=0)]))
+
+        topology = TerrainTopology(geometries=[wkb_1, wkb_2])
+        topologyW = TerrainTopology(geometries=[wkt_1, wkt_2])
+        self.assertTrue(np.array_equal(topologyW.vertices, topology.vertices))
+        self.assertTrue(np.array_equal(topologyW.faces, topology.faces))
+
+    def testTopologyIncremental(self):
+        topology = TerrainTopology(geometries=[vertices_1, vertices_2])
+
+        topologyI = TerrainTopology(geometries=[vertices_1])
+        self.assertEqual(len(topologyI.vertices), 3)
+        topologyI.addGeometries([wkb_2])
+        self.assertTrue(np.array_equal(topologyI.vertices, topology.vertices))
+        self.assertTrue(np.array_equal(topologyI.faces, topology.faces))
+        self.assertTrue(np.array_equal(topologyI.cartesianVertices,
+                                       topology.cartesianVertices))
+
+        # Append several batches and finalize once
+        topologyI = TerrainTopology(hasLighting=True)
+        topologyI.addGeometries([wkt_1], finalize=False)
+        topologyI.addGeometries(np.array([vertices_2]), finalize=False)
+        self.assertEqual(len(topologyI.faces), 0)
+        topologyI.finalize()
+        self.assertTrue(np.array_equal(topologyI.faces, topology.faces))
+        self.assertEqual(topologyI.verticesUnitVectors.shape, (5, 3))
+
+        # Topologies created from arrays can be extended too
+        topologyI = TerrainTopology.fromArrays([vertices_1])
+        topologyI.addGeometries([vertices_2])
+        self.assertTrue(np.array_equal(topologyI.vertices, topology.vertices))
+        self.assertTrue(np.array_equal(topologyI.faces, topology.faces))
+
+        # Vertices added one by one are merged with the ones added in bulk,
+        # -0.0 and 0.0 being the same coordinate
+        square = [[0.0, 0.0, 1.0], [1.0, 0.0, 1.0], [1.0, 1.0, 1.0], [0.0, 1.0, 1.0]]
+        topologyI = TerrainTopology(autocorrectGeometries=True)
+        topologyI.addGeometries([[[-0.0, 0.0, 1.0], [1.0, 0.0, 1.0], [2.0, 0.0, 1.0]],
+                                 [[1.0, 0.0, 1.0], [1.0, 1.0, 1.0], [0.0, 1.0, 1.0]]])
+        topologyI.addGeometries([square])
+        topologyI.addGeometries(np.array([[square[0], square[1], [2.0, 0.0, 1.0]]]))
+        self.assertEqual(len(topologyI.vertices), 5)
+        self.assertEqual(len(topologyI.faces), 5)
+        self.assertEqual(topologyI.faces[-1].tolist(), [0, 1, 2])
+
+    def testTopologyManyBatches(self):
+        heights = np.random.RandomState(0).uniform(0.0, 100.0, (17, 17))
+        reference = TerrainTopology.fromHeightGrid(heights, [7.0, 46.0, 7.1, 46.1])
+        triangles = reference.vertices[reference.faces].tolist()
+        topology = TerrainTopology(geometries=triangles)
+
+        # The vertices are merged with an index kept across the batches
+        topologyI = TerrainTopology()
+        for i in range(0, len(triangles), 7):
+            topologyI.addGeometries(triangles[i:i + 7], finalize=False)
+        self.assertEqual(len(topologyI.verticesLookup), 17 * 17)
+        topologyI.finalize()
+        self.assertTrue(np.array_equal(topologyI.vertices, topology.vertices))
+        self.assertTrue(np.array_equal(topologyI.faces, topology.faces))
+
+    def testTopologyMergeTolerance(self):
+        # The shared vertex differs by one ulp between the two triangles
+        lon = float(np.nextafter(7.1, 8.0))
+        geometries = [
+            [[7.1, 46.2, 300.0], [7.2, 46.2, 300.0], [7.2, 46.3, 300.0]],
+            [[lon, 46.2, 300.0], [7.2, 46.3, 300.0], [7.1, 46.3, 300.0]]
+        ]
+        topology = TerrainTopology(geometries=geometries)
+        self.assertEqual(len(topology.vertices), 4)
+        topology = TerrainTopology(geometries=geometries, autocorrectGeometries=True)
+        self.assertEqual(len(topology.vertices), 4)
+
+        topologyI = TerrainTopology()
+        for geometry in geometries:
+            topologyI.addGeometries([geometry])
+        self.assertEqual(len(topologyI.vertices), 4)
+
+    def testTopologyFromHeightGrid(self):
+        heights = np.array([[10.0, 12.0, 11.0],
+                            [9.5, 13.2, 12.1]])
+        bounds = [7.0, 46.0, 7.2, 46.1]
+        topology = TerrainTopology.fromHeightGrid(heights, bounds, hasLighting=True)
+        self.assertEqual(topology.vertices.shape, (6, 3))
+        self.assertEqual(topology.faces.shape, (4, 3))
+        self.assertEqual(topology.verticesUnitVectors.shape, (6, 3))
+        self.assertEqual(topology.minLon, 7.0)
+        self.assertEqual(topology.maxLat, 46.1)
+        self.assertEqual(topology.maxHeight, 13.2)
+
+        # Same topology as the triangles of the grid cells
+        nw, ne, sw, se = [7.0, 46.1, 10.0], [7.1, 46.1, 12.0], \
+            [7.0, 46.0, 9.5], [7.1, 46.0, 13.2]
+        nw2, sw2 = [7.2, 46.1, 11.0], [7.2, 46.0, 12.1]
+        triangles = [[sw, se, ne], [sw, ne, nw], [se, sw2, nw2], [se, nw2, ne]]
+        topologyA = TerrainTopology.fromArrays(triangles)
+        self.assertTrue(np.allclose(topologyA.vertices, topology.vertices))
+        self.assertTrue(np.array_equal(topologyA.faces, topology.faces))
+        self.assertTrue(np.allclose(topologyA.cartesianVertices,
+                                    topology.cartesianVertices))
+
+        with self.assertRaises(ValueError):
+            TerrainTopology.fromHeightGrid([1.0, 2.0], bounds)
+
+    def testTopologyReorder(self):
+        heights = np.random.RandomState(0).uniform(0.0, 100.0, (9, 9))
+        bounds = [7.0, 46.0, 7.1, 46.1]
+        reference = TerrainTopology.fromHeightGrid(heights, bounds, hasLighting=True)
+        triangles = reference.vertices[reference.faces]
+        shuffled = triangles[np.random.RandomState(1).permutation(len(triangles))]
+        for kwargs in ({}, {'morton': True}, {'vertexCache': False, 'morton': True}):
+            topology = TerrainTopology.fromArrays(shuffled, hasLighting=True)
+            topology.reorder(**kwargs)
+            # Same triangles
+            self.assertEqual(
+                sorted(map(tuple, topology.vertices[topology.faces].tolist())),
+                sorted(map(tuple, triangles.tolist())))
+            self.assertTrue(np.allclose(topology.cartesianVertices,
+                                        LLH2ECEFArray(topology.vertices)))
+            # Vertices in the order of their first use
+            indices = topology.indexData
+            self.assertTrue(np.all(
+                indices <= np.maximum.accumulate(np.concatenate(([0], indices)))[
+                    :-1] + 1))
+            self.assertEqual(topology.verticesUnitVectors.shape,
+                             topology.vertices.shape)
+
+        # Vertices are still merged when adding geometries
+        topology.addGeometries(triangles[:2])
+        self.assertEqual(len(topology.vertices), 81)
+        self.assertEqual(len(topology.faces), len(triangles) + 2)
+
+        # Faces added without finalizing, which reuse existing vertices
+        topology = TerrainTopology.fromArrays(triangles[:10], hasLighting=True)
+        topology.addGeometries(triangles[5:10], finalize=False)
+        topology.reorder()
+        self.assertEqual(len(topology.faces), 15)
+        self.assertTrue(np.allclose(
+            topology.verticesUnitVectors,
+            computeNormals(topology.cartesianVertices, topology.faces)))
+
+    def testTopologyCounterClockWise(self):
+        clockWise = [vertices_1[0], vertices_1[2], vertices_1[1]]
+        topology = TerrainTopology(geometries=[clockWise])
+        self.assertEqual(topology.vertices.tolist(), vertices_1)
+
+        triangles = np.array([vertices_1, clockWise, vertices_2, vertices_2[::-1]])
+        counterClockWise = TerrainTopology._assureCounterClockWiseTriangles(triangles)
+        self.assertEqual(counterClockWise.tolist(),
+                         [vertices_1, vertices_1, vertices_2,
+                          [vertices_2[2], vertices_2[0], vertices_2[1]]])
+        # The input is not modified
+        self.assertEqual(triangles[1].tolist(), clockWise)
+
     def testTopologyWithAutocorrect(self):
         topology = TerrainTopology(geometries=[vertices_1, vertices_2],
             autocorrectGeometries=True)
@@ -169,6 +392,15 @@ class TestTopology(unittest.TestCase):
         topology = TerrainTopology(geometries=[wkt], autocorrectGeometries=True)
         self.assertEqual(len(topology.faces), 4)
 
+        # Concave polygon, none of the triangles goes outside of the polygon
+        wkt = 'POLYGON Z ((0 0 1, 2 0 1, 2 1 1, 1 1 1, 1 2 1, 0 2 1, 0 0 1))'
+        topology = TerrainTopology(geometries=[wkt, wkt_1], autocorrectGeometries=True)
+        self.assertEqual(len(topology.faces), 5)
+        self.assertEqual(len(topology.vertices), 9)
+        for face in topology.faces[:4]:
+            centroid = topology.vertices[face].mean(axis=0)
+            self.assertFalse(centroid[0] > 1 and centroid[1] > 1)
+
     def testTopologyBadGeoms(self):
         wkt = 'POLYGON Z ((2.1 3.1 3.3, 1.2 1.5 4.2, 3.2 2.2 4.5, 2.5 1.2 1.1,' \
               ' 2.1 3.1 3.3))'
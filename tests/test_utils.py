@@ -2,7 +2,14 @@
 
 import unittest
 
-from quantized_mesh_tile.utils import octDecode, octEncode
+import numpy as np
+
+import quantized_mesh_tile.cartesian3d as c3d
+from quantized_mesh_tile.utils import (computeNormals, decodeIndices,
+                                       encodeIndices, mortonCodes, octDecode,
+                                       octDecodeArray, octEncode,
+                                       octEncodeArray, triangleArea,
+                                       triangulatePolygons, vertexCacheOrder)
 
 
 class TestUtils(unittest.TestCase):
@@ -56,3 +63,127 @@ class TestUtils(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             octEncode([0.0, 0.0, 0.0])
+
+    def testOctEncodeDecodeArray(self):
+        xy = [[0, 0], [255, 255], [128, 128], [12, 200], [255, 0], [90, 33]]
+        vectors = octDecodeArray(np.array(xy, dtype='uint8'))
+        self.assertEqual(vectors.shape, (6, 3))
+        for i, (x, y) in enumerate(xy):
+            self.assertTrue(np.allclose(vectors[i], octDecode(x, y)))
+
+        encoded = octEncodeArray(vectors)
+        self.assertEqual(encoded.dtype, np.uint8)
+        for i, vector in enumerate(vectors):
+            self.assertEqual(list(encoded[i]), octEncode(list(vector)))
+
+        with self.assertRaises(ValueError):
+            octEncodeArray([[0.0, 0.0, 1.0], [2.0, 0.0, 0.0]])
+        with self.assertRaises(ValueError):
+            octDecodeArray([[0, 256]])
+
+    def testComputeNormals(self):
+        vertices = np.array([[6378137.0, 0.0, 0.0],
+                             [6378000.0, 1200.0, 10.0],
+                             [6377990.0, 0.0, 1500.0],
+                             [6377900.0, 1300.0, 1400.0]])
+        faces = np.array([[0, 1, 2], [2, 1, 3]])
+        normals = computeNormals(vertices, faces)
+        self.assertEqual(normals.shape, (4, 3))
+
+        # Area weighted sum of the face normals
+        expected = [[0.0, 0.0, 0.0] for v in vertices]
+        for face in faces:
+            v0, v1, v2 = [vertices[i] for i in face]
+            normal = np.cross(c3d.subtract(v1, v0), c3d.subtract(v2, v0))
+            area = triangleArea(v0, v1)
+            for i in face:
+                expected[i] = c3d.add(expected[i], [c * area for c in normal])
+        for i, normal in enumerate(normals):
+            self.assertAlmostEqual(c3d.magnitude(normal), 1.0)
+            self.assertTrue(np.allclose(normal, c3d.normalize(expected[i])))
+
+    def testEncodeDecodeIndices(self):
+        indices = [0, 1, 2, 1, 2, 3, 0, 3, 4, 4, 2, 5]
+        codes = encodeIndices(indices)
+        self.assertEqual(list(codes), [0, 0, 0, 2, 1, 0, 4, 1, 0, 1, 3, 0])
+        self.assertEqual(list(decodeIndices(codes)), indices)
+
+        self.assertEqual(len(encodeIndices([])), 0)
+        self.assertEqual(len(decodeIndices([])), 0)
+
+    def testEncodeIndicesErrors(self):
+        # Index 2 is used before index 1
+        with self.assertRaises(ValueError):
+            encodeIndices([0, 2, 1])
+
+    def testTriangulatePolygons(self):
+        # Concave polygons, clockwise or not, a triangle and a dart
+        square = [[0, 0, 1], [2, 0, 1], [2, 1, 1], [1, 1, 1], [1, 2, 1], [0, 2, 1]]
+        dart = [[0, 0, 0], [2, 0, 0], [1, 0.5, 0], [0, 2, 0]]
+        triangle = [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+        angles = np.linspace(0, 2 * np.pi, 11)[:-1]
+        radius = np.where(np.arange(10) % 2, 1.0, 2.5)
+        star = np.column_stack(
+            (radius * np.cos(angles), radius * np.sin(angles), angles)).tolist()
+        polygons = [square, star, dart, triangle, square[::-1], dart[::-1]]
+        coordinates = np.concatenate(polygons)
+        offsets = np.cumsum([0] + [len(polygon) for polygon in polygons])
+
+        triangles, counts = triangulatePolygons(coordinates, offsets)
+        self.assertEqual(counts.tolist(), [4, 8, 2, 1, 4, 2])
+        self.assertEqual(triangles.shape, (21, 3, 3))
+
+        def area(ring):
+            x, y = np.asarray(ring)[:, 0], np.asarray(ring)[:, 1]
+            return 0.5 * abs(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y))
+
+        # The triangles cover the polygons without overlapping
+        start = 0
+        for polygon, count in zip(polygons, counts):
+            polygonTriangles = triangles[start:start + count]
+            start += count
+            self.assertAlmostEqual(
+                sum(area(t) for t in polygonTriangles), area(polygon))
+            for t in polygonTriangles.tolist():
+                for vertex in t:
+                    self.assertIn(vertex, np.asarray(polygon, dtype=float).tolist())
+
+        # A star with many reflex vertices
+        angles = np.linspace(0, 2 * np.pi, 1001)[:-1]
+        radius = np.where(np.arange(1000) % 2, 1.0, 0.5)
+        star = np.column_stack(
+            (radius * np.cos(angles), radius * np.sin(angles), angles))
+        triangles, counts = triangulatePolygons(star, [0, 1000])
+        self.assertEqual(counts.tolist(), [998])
+        self.assertAlmostEqual(sum(area(t) for t in triangles), area(star))
+
+        with self.assertRaises(ValueError):
+            triangulatePolygons([[0, 0, 0], [1, 1, 1]], [0, 2])
+
+    def testMortonCodes(self):
+        codes = mortonCodes([0, 1, 0, 1, 2, 65535], [0, 0, 1, 1, 0, 65535])
+        self.assertEqual(codes.tolist(), [0, 1, 2, 3, 4, 2 ** 32 - 1])
+
+    def testVertexCacheOrder(self):
+        # A shuffled grid of 16 * 16 cells
+        rows = np.arange(16)[:, np.newaxis] * 17
+        nw = (rows + np.arange(16)).ravel()
+        faces = np.concatenate((np.column_stack((nw + 17, nw + 18, nw + 1)),
+                                np.column_stack((nw + 17, nw + 1, nw))))
+        faces = faces[np.random.RandomState(0).permutation(len(faces))]
+
+        def cacheMisses(faces, cacheSize=16):
+            cache = []
+            misses = 0
+            for vertex in faces.ravel().tolist():
+                if vertex in cache:
+                    cache.remove(vertex)
+                else:
+                    misses += 1
+                cache = [vertex] + cache[:cacheSize - 1]
+            return misses
+
+        order = vertexCacheOrder(faces)
+        self.assertEqual(sorted(order.tolist()), list(range(len(faces))))
+        self.assertLess(cacheMisses(faces[order]), 0.5 * cacheMisses(faces))
+        self.assertEqual(len(vertexCacheOrder(np.zeros((0, 3)))), 0)